@@ -1,6 +1,8 @@
 import sys, os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 import math
+import json
+import time
 import asyncio
 import os
 from aiogram.fsm.context import FSMContext
@@ -11,17 +13,25 @@ from aiogram import Bot, Dispatcher, F, Router
 from aiogram.filters import Command
 from aiogram.types import (
     Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton,
-    WebAppInfo, PreCheckoutQuery, LabeledPrice 
+    WebAppInfo, PreCheckoutQuery, LabeledPrice, BufferedInputFile
 )
 from aiogram.enums import ParseMode
-from sqlalchemy import select, desc, func
+from sqlalchemy import select, update, func
+from aiogram.exceptions import TelegramForbiddenError
+from sqlalchemy.exc import SQLAlchemyError
 from dotenv import load_dotenv
 import random
 
 from database.models import (
     async_session, User, Case, CaseOpening, 
-    Gift, CaseItem, Withdrawal, Payment, ReferralEarning, PromoCode, PromoCodeUsage
+    Gift, CaseItem, Withdrawal, Payment, ReferralEarning, PromoCode, PromoCodeUsage,
+    BroadcastJob, AuditLog, HouseBank
 )
+from database import queries
+from database.stats import bump_user_stats, get_user_stats
+from database.promo import record_promo_usage
+from database.promo_gen import generate_promo_codes, promo_codes_csv, MAX_BULK_COUNT
+from telegram_dispatch import OutboundDispatcher, PRIORITY_NORMAL, PRIORITY_BULK
 
 load_dotenv()
 class AdminState(StatesGroup):
@@ -33,6 +43,7 @@ class AdminState(StatesGroup):
     promo_type = State()
     promo_value = State()
     promo_limit = State()
+    promo_bulk = State()
 # Инициализация бота
 bot = Bot(token=os.getenv("BOT_TOKEN"))
 admin_bot = Bot(token=os.getenv("ADMIN_BOT_TOKEN"))
@@ -43,6 +54,10 @@ WEBAPP_URL = os.getenv("WEBAPP_URL", "https://tgqwen.onrender.com/")
 ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x]
 PAYMENT_TOKEN = os.getenv("PAYMENT_TOKEN")
 
+# Все исходящие уведомления и рассылки — через общую очередь с лимитами Telegram
+# (бот забирает основную долю лимита токена, серверу остается SERVER_SEND_RATE)
+outbound = OutboundDispatcher(rate=float(os.getenv("BOT_SEND_RATE", "25")), name="bot-tg")
+
 
 # === УТИЛИТЫ ===
 
@@ -53,7 +68,7 @@ async def get_or_create_user(telegram_id: int, username: str = None,
     try:
         async with async_session() as session:
             result = await session.execute(
-                select(User).where(User.telegram_id == telegram_id)
+                queries.user_by_telegram_id(telegram_id)
             )
             user = result.scalar_one_or_none()
 
@@ -71,13 +86,15 @@ async def get_or_create_user(telegram_id: int, username: str = None,
                 # Если есть реферальный код — находим реферера
                 if referrer_code:
                     referrer_result = await session.execute(
-                        select(User).where(User.referral_code == referrer_code)
+                        queries.user_by_referral_code(referrer_code)
                     )
                     referrer = referrer_result.scalar_one_or_none()
                     if referrer and referrer.telegram_id != telegram_id:
                         user.referrer_id = referrer.id
                 
                 session.add(user)
+                if user.referrer_id:
+                    await bump_user_stats(session, user.referrer_id, total_referrals=1)
                 await session.commit()
                 await session.refresh(user)
                 print(f"✅ Новый пользователь создан: {telegram_id} ({first_name})")
@@ -96,6 +113,10 @@ async def get_or_create_user(telegram_id: int, username: str = None,
                 if photo_url and user.photo_url != photo_url:
                     user.photo_url = photo_url
                     updated = True
+                if user.is_blocked:
+                    # Написал боту — значит, разблокировал; снова получает рассылки
+                    user.is_blocked = False
+                    updated = True
                 if updated:
                     await session.commit()
                     print(f"🔄 Данные пользователя обновлены: {telegram_id}")
@@ -142,9 +163,7 @@ async def open_case(user_id: int, case_id: int) -> dict:
             user.balance -= case.price
         
         # Получаем предметы кейса
-        result = await session.execute(
-            select(CaseItem).where(CaseItem.case_id == case_id)
-        )
+        result = await session.execute(queries.case_items(case_id))
         items = result.scalars().all()
         
         if not items:
@@ -175,6 +194,7 @@ async def open_case(user_id: int, case_id: int) -> dict:
             gift_id=gift.id
         )
         session.add(opening)
+        await bump_user_stats(session, user.id, total_openings=1, inventory_count=1, inventory_value=gift.value or 0)
         await session.commit()
         await session.refresh(opening)
         
@@ -208,8 +228,13 @@ async def approve_withdrawal(callback: CallbackQuery):
         
         # Помечаем сам предмет как выведенный (чтобы он пропал из инвентаря)
         opening = await session.get(CaseOpening, wd.opening_id)
-        if opening:
+        if opening and not opening.is_withdrawn:
+            # Сначала сам вывод: если строки user_stats еще нет, пересчет должен его уже видеть
             opening.is_withdrawn = True
+            await session.flush()
+            if not opening.is_sold:
+                gift = await session.get(Gift, opening.gift_id)
+                await bump_user_stats(session, opening.user_id, inventory_count=-1, inventory_value=-(gift.value or 0))
             
         await session.commit()
         
@@ -358,7 +383,7 @@ async def process_payment(callback: CallbackQuery):
         return
 
     async with async_session() as session:
-        user = (await session.execute(select(User).where(User.telegram_id == callback.from_user.id))).scalar_one_or_none()
+        user = (await session.execute(queries.user_by_telegram_id(callback.from_user.id))).scalar_one_or_none()
         if not user:
             await callback.answer("❌ Пользователь не найден", show_alert=True)
             return
@@ -417,7 +442,7 @@ async def process_successful_payment(message: Message):
         return
 
     async with async_session() as session:
-        user = (await session.execute(select(User).where(User.telegram_id == message.from_user.id))).scalar_one_or_none()
+        user = (await session.execute(queries.user_by_telegram_id(message.from_user.id))).scalar_one_or_none()
         if not user:
             print(f"[PAYMENT] ❌ User not found: {message.from_user.id}")
             return
@@ -455,19 +480,9 @@ async def process_successful_payment(message: Message):
         payment.telegram_payment_id = charge_id
 
         # Фиксируем использование промокода (только если ещё не зафиксировано)
+        # (дубль отсекается уникальным индексом, uses_count увеличивается атомарно)
         if payment.promo_id:
-            promo = await session.get(PromoCode, payment.promo_id)
-            if promo:
-                # Проверяем что usage ещё нет — защита от дублей
-                existing_usage = (await session.execute(
-                    select(PromoCodeUsage).where(
-                        PromoCodeUsage.user_id == user.id,
-                        PromoCodeUsage.promo_id == promo.id
-                    )
-                )).scalar_one_or_none()
-                if not existing_usage:
-                    promo.uses_count += 1
-                    session.add(PromoCodeUsage(user_id=user.id, promo_id=promo.id))
+            await record_promo_usage(session, payment.promo_id, user.id)
 
         # Начисляем: сумма из БД + бонус из БД
         total_add = amount + bonus
@@ -487,7 +502,9 @@ async def process_successful_payment(message: Message):
                         amount=referral_bonus,
                         source='deposit_bonus'
                     ))
+                    await bump_user_stats(session, referrer.id, referral_earnings_available=referral_bonus)
 
+        await bump_user_stats(session, user.id, total_deposits=amount)
         await session.commit()
 
         print(f"[PAYMENT] ✅ payment_id={payment_id} user={user.telegram_id} amount={amount} bonus={bonus} charge={charge_id}")
@@ -500,17 +517,19 @@ async def process_successful_payment(message: Message):
     await message.answer(text)
 
     # Уведомляем реферера если есть бонус
+    # Платеж уже зачислен: ошибка поиска или отправки (реферер заблокировал бота) не должна ронять обработчик
     if referral_bonus > 0 and user.referrer_id:
         try:
             async with async_session() as s2:
-                referrer = await s2.get(User, user.referrer_id)
-                if referrer:
-                    await bot.send_message(
-                        chat_id=referrer.telegram_id,
-                        text=f"🎁 <b>Реферальная награда!</b>\nВаш реферал пополнил баланс.\n+{referral_bonus} ⭐ добавлено в ваши реферальные доходы.",
-                        parse_mode="HTML"
-                    )
-        except Exception: pass
+                referrer_tg_id = await s2.scalar(select(User.telegram_id).where(User.id == user.referrer_id))
+            if referrer_tg_id:
+                outbound.submit(lambda: bot.send_message(
+                    chat_id=referrer_tg_id,
+                    text=f"🎁 <b>Реферальная награда!</b>\nВаш реферал пополнил баланс.\n+{referral_bonus} ⭐ добавлено в ваши реферальные доходы.",
+                    parse_mode="HTML"
+                ), chat_id=referrer_tg_id, priority=PRIORITY_NORMAL)
+        except Exception as e:
+            print(f"[PAYMENT] ⚠️ Не удалось уведомить реферера: {e}")
 
 
 @router.callback_query(F.data == "stats")
@@ -518,24 +537,16 @@ async def show_stats(callback: CallbackQuery):
     """Показать статистику"""
     async with async_session() as session:
         result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
+            queries.user_by_telegram_id(callback.from_user.id)
         )
         user = result.scalar_one()
         
-        # Количество открытий
-        openings_result = await session.execute(
-            select(CaseOpening).where(CaseOpening.user_id == user.id)
-        )
-        openings_count = len(openings_result.scalars().all())
+        # Количество открытий — из user_stats
+        stats = await get_user_stats(session, user.id)
+        openings_count = stats.total_openings
         
         # Количество выводов
-        withdrawals_result = await session.execute(
-            select(Withdrawal).where(
-                Withdrawal.user_id == user.id,
-                Withdrawal.status == "completed"
-            )
-        )
-        withdrawals_count = len(withdrawals_result.scalars().all())
+        withdrawals_count = await session.scalar(queries.user_withdrawals_count(user.id, "completed"))
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_menu")]
@@ -644,6 +655,7 @@ async def admin_promos_menu(callback: CallbackQuery):
     if callback.from_user.id not in ADMIN_IDS: return 
     kb = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➕ Создать промокод", callback_data="promo_create")],
+        [InlineKeyboardButton(text="📦 Массовая генерация", callback_data="promo_bulk")],
         [InlineKeyboardButton(text="📋 Активные промокоды", callback_data="promo_list")],
         [InlineKeyboardButton(text="◀️ В меню", callback_data="admin_back")]
     ])
@@ -712,10 +724,50 @@ async def promo_create_finish(message: Message, state: FSMContext):
         await message.answer(f"Ошибка: {e}")
         await state.clear()
 
+@router.callback_query(F.data == "promo_bulk")
+async def promo_bulk_start(callback: CallbackQuery, state: FSMContext):
+    if callback.from_user.id not in ADMIN_IDS:
+        return
+    await state.set_state(AdminState.promo_bulk)
+    kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="◀️ Отмена", callback_data="admin_promos")]])
+    await callback.message.edit_text(
+        "📦 <b>Массовая генерация промокодов</b>\n\n"
+        "Отправь одной строкой: <code>ПРЕФИКС КОЛИЧЕСТВО ТИП БОНУС [ЛИМИТ]</code>\n"
+        "Например: <code>SUMMER 1000 balance 50 1</code>\n\n"
+        f"Тип: balance (звезды) или deposit (% к пополнению). Лимит по умолчанию 1. Максимум {MAX_BULK_COUNT} кодов.",
+        reply_markup=kb, parse_mode="HTML"
+    )
+
+@router.message(AdminState.promo_bulk)
+async def promo_bulk_finish(message: Message, state: FSMContext):
+    try:
+        parts = message.text.split()
+        prefix, count, p_type, value = parts[0], int(parts[1]), parts[2].lower(), int(parts[3])
+        limit = int(parts[4]) if len(parts) > 4 else 1
+    except (ValueError, IndexError, AttributeError):
+        return await message.answer("❌ Формат: <code>SUMMER 1000 balance 50 1</code>", parse_mode="HTML")
+
+    kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="◀️ Назад", callback_data="admin_promos")]])
+    wait_msg = await message.answer(f"⏳ Генерирую {count} промокодов...")
+    try:
+        codes = await generate_promo_codes(prefix, count, p_type, value, limit)
+    except ValueError as e:
+        return await wait_msg.edit_text(f"❌ {e}", reply_markup=kb)
+    except SQLAlchemyError as e:
+        # Транзакция генератора уже откатана — ни один код из пачки не создан
+        print(f"[PROMO] ❌ Ошибка массовой генерации: {e}")
+        return await wait_msg.edit_text("❌ Ошибка базы данных, промокоды не созданы. Попробуй еще раз.", reply_markup=kb)
+    finally:
+        await state.clear()
+
+    document = BufferedInputFile(promo_codes_csv(codes, p_type, value, limit), filename=f"promo_{prefix.upper()}_{len(codes)}.csv")
+    await message.answer_document(document, caption=f"✅ Создано промокодов: {len(codes)}", reply_markup=kb)
+    await wait_msg.delete()
+
 @router.callback_query(F.data == "promo_list")
 async def promo_list(callback: CallbackQuery):
     async with async_session() as session:
-        promos = (await session.execute(select(PromoCode).where(PromoCode.is_active == True).order_by(desc(PromoCode.created_at)).limit(10))).scalars().all()
+        promos = (await session.execute(queries.recent_promos(10))).scalars().all()
     
     if not promos:
         return await callback.message.edit_text("Нет активных промокодов.", reply_markup=InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="◀️ Назад", callback_data="admin_promos")]]))
@@ -736,7 +788,7 @@ async def show_pending_withdrawals(callback: CallbackQuery):
     
     async with async_session() as session:
         # Считаем сколько всего нерассмотренных заявок
-        total = await session.scalar(select(func.count(Withdrawal.id)).where(Withdrawal.status == 'pending'))
+        total = await session.scalar(queries.pending_withdrawals_count())
         
         if total == 0:
             kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="◀️ В меню", callback_data="admin_back")]])
@@ -746,13 +798,7 @@ async def show_pending_withdrawals(callback: CallbackQuery):
         if page < 1: page = 1
         
         # Получаем 1 конкретную заявку для текущей страницы
-        withdrawals = (await session.execute(
-            select(Withdrawal)
-            .where(Withdrawal.status == 'pending')
-            .order_by(Withdrawal.created_at)
-            .limit(1)
-            .offset(page - 1)
-        )).scalars().all()
+        withdrawals = (await session.execute(queries.pending_withdrawals(1, page - 1))).scalars().all()
         
         if not withdrawals:
             return await callback.answer("Ошибка загрузки", show_alert=True)
@@ -803,7 +849,7 @@ async def show_history_withdrawals(callback: CallbackQuery):
     
     async with async_session() as session:
         # Ищем все, кроме 'pending' (то есть completed и rejected)
-        total = await session.scalar(select(func.count(Withdrawal.id)).where(Withdrawal.status != 'pending'))
+        total = await session.scalar(queries.processed_withdrawals_count())
         
         if total == 0:
             kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="◀️ В меню", callback_data="admin_back")]])
@@ -813,13 +859,7 @@ async def show_history_withdrawals(callback: CallbackQuery):
         if page > total_pages: page = total_pages
         if page < 1: page = 1
         
-        withdrawals = (await session.execute(
-            select(Withdrawal)
-            .where(Withdrawal.status != 'pending')
-            .order_by(desc(Withdrawal.completed_at))
-            .limit(limit)
-            .offset((page - 1) * limit)
-        )).scalars().all()
+        withdrawals = (await session.execute(queries.processed_withdrawals(limit, (page - 1) * limit))).scalars().all()
         
         text = f"🗄 <b>История обработанных заявок</b>\n<i>Страница {page} из {total_pages}</i>\n\n"
         
@@ -850,6 +890,21 @@ async def admin_panel(message: Message, state: FSMContext):
     await state.clear()
     await message.answer("👑 <b>Панель администратора</b>\n\nВыбери действие:", reply_markup=get_admin_keyboard(), parse_mode="HTML")
 
+@router.message(Command("bank"))
+async def admin_bank(message: Message):
+    """Текущий банк заведения (общий лимит риска игр для всех воркеров сервера)"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    async with async_session() as session:
+        banks = (await session.execute(select(HouseBank).order_by(HouseBank.name))).scalars().all()
+    if not banks:
+        return await message.answer("🏦 Банк еще не создан — он появится после запуска сервера.")
+    text = "🏦 <b>Банк заведения</b>\n\n"
+    for b in banks:
+        updated = b.updated_at.strftime('%d.%m %H:%M') if b.updated_at else "—"
+        text += f"▪️ {b.name}: <b>{b.balance} ⭐</b> (обновлен {updated})\n"
+    await message.answer(text, parse_mode="HTML")
+
 # --- ИСПРАВЛЕННАЯ КНОПКА НАЗАД ---
 @router.callback_query(F.data == "admin_back")
 async def admin_back(callback: CallbackQuery, state: FSMContext):
@@ -877,9 +932,7 @@ async def admin_users_list(callback: CallbackQuery):
         if page < 1: page = 1
         
         # Получаем юзеров для текущей страницы
-        users_result = await session.execute(
-            select(User).order_by(desc(User.created_at)).limit(limit).offset((page - 1) * limit)
-        )
+        users_result = await session.execute(queries.users_page(limit, (page - 1) * limit))
         users = users_result.scalars().all()
         
     kb = []
@@ -911,37 +964,33 @@ async def admin_user_info(callback: CallbackQuery, state: FSMContext):
     tg_id = int(callback.data.split("_")[3])
     
     async with async_session() as session:
-        user = (await session.execute(select(User).where(User.telegram_id == tg_id))).scalar_one_or_none()
+        user = (await session.execute(queries.user_by_telegram_id(tg_id))).scalar_one_or_none()
         if not user:
             return await callback.answer("Юзер не найден!", show_alert=True)
             
+        stats = await get_user_stats(session, user.id)
+
         # 1. Открыто кейсов
-        openings_count = await session.scalar(select(func.count(CaseOpening.id)).where(CaseOpening.user_id == user.id))
+        openings_count = stats.total_openings
         
         # 2. Сумма депозитов
-        total_dep = await session.scalar(select(func.sum(Payment.amount)).where(Payment.user_id == user.id, Payment.status == 'completed')) or 0
+        total_dep = stats.total_deposits
         
         # 3. Выводы
-        withdrawals_count = await session.scalar(select(func.count(Withdrawal.id)).where(Withdrawal.user_id == user.id))
+        withdrawals_count = await session.scalar(queries.user_withdrawals_count(user.id))
         
-        # 4. Анализ инвентаря
-        inv_result = await session.execute(
-            select(CaseOpening, Gift)
-            .join(Gift, CaseOpening.gift_id == Gift.id)
-            .where(CaseOpening.user_id == user.id, CaseOpening.is_sold == False, CaseOpening.is_withdrawn == False)
-        )
-        inventory = inv_result.all() # Список кортежей (CaseOpening, Gift)
-        inv_count = len(inventory)
-        inv_value = sum(g.value for o, g in inventory if g.value)
+        # 4. Анализ инвентаря: счетчики из user_stats, плюс только топ-3 предмета
+        inv_count = stats.inventory_count
+        inv_value = stats.inventory_value
+        top_items = (await session.execute(queries.top_inventory_gifts(user.id, 3))).scalars().all()
         
     # Сохраняем в стейт, чтобы можно было выдать баланс
     await state.update_data(target_user_id=user.telegram_id)
     
     # Формируем текст инвентаря
     inv_text = f"Предметов: <b>{inv_count}</b> (Ценность: {inv_value} ⭐)"
-    if inv_count > 0:
-        # Берем топ-3 самых дорогих предмета из инвентаря
-        top_items = sorted([g for o, g in inventory], key=lambda x: x.value or 0, reverse=True)[:3]
+    if inv_count > 0 and top_items:
+        # Топ-3 самых дорогих предмета из инвентаря
         top_names = ", ".join(f"{g.name}" for g in top_items)
         inv_text += f"\n└ <i>Топ дроп: {top_names}</i>"
         
@@ -975,30 +1024,49 @@ async def admin_user_info(callback: CallbackQuery, state: FSMContext):
     await callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
 
 # --- МАССОВЫЙ БОНУС (КИЛЛЕР ФИЧА) ---
+MASS_BONUS_MAX = int(os.getenv("MASS_BONUS_MAX", "10000"))  # ⭐ на игрока за одно начисление — защита от опечатки
+
 @router.callback_query(F.data == "admin_mass_bonus")
 async def admin_mass_bonus_start(callback: CallbackQuery, state: FSMContext):
     if callback.from_user.id not in ADMIN_IDS:
         return
     await state.set_state(AdminState.waiting_for_mass_bonus)
     kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="◀️ Отмена", callback_data="admin_back")]])
-    await callback.message.edit_text("💸 <b>МАССОВЫЙ БОНУС</b>\n\nВведи сумму звезд, которую нужно начислить <b>ВСЕМ</b> зарегистрированным пользователям:", reply_markup=kb, parse_mode="HTML")
+    await callback.message.edit_text(
+        "💸 <b>МАССОВЫЙ БОНУС</b>\n\nВведи сумму звезд, которую нужно начислить <b>ВСЕМ</b> зарегистрированным пользователям.\n\n"
+        "Чтобы начислить только активным, добавь через пробел число дней: <code>100 7</code> — тем, кто открывал кейсы за последние 7 дней.",
+        reply_markup=kb, parse_mode="HTML"
+    )
 
 @router.message(AdminState.waiting_for_mass_bonus)
 async def process_mass_bonus(message: Message, state: FSMContext):
     try:
-        amount = int(message.text.strip())
-    except ValueError:
-        return await message.answer("❌ Введи просто число!")
-        
+        parts = message.text.split()
+        amount = int(parts[0])
+        active_days = int(parts[1]) if len(parts) > 1 else None
+    except (ValueError, IndexError):
+        return await message.answer("❌ Введи сумму числом, например <code>100</code> или <code>100 7</code>", parse_mode="HTML")
+    if amount <= 0 or (active_days is not None and active_days <= 0):
+        return await message.answer("❌ Сумма и число дней должны быть больше нуля")
+    if amount > MASS_BONUS_MAX:
+        return await message.answer(f"❌ Не больше {MASS_BONUS_MAX} ⭐ на игрока за одно начисление")
+
+    # Один UPDATE вместо загрузки всей таблицы users: время и память не зависят от числа игроков
+    since = datetime.utcnow() - timedelta(days=active_days) if active_days else None
+    stmt = queries.mass_bonus(amount, since)
+
     async with async_session() as session:
-        users = (await session.execute(select(User))).scalars().all()
-        for u in users:
-            u.balance += amount
+        affected = (await session.execute(stmt)).rowcount
+        session.add(AuditLog(
+            admin_id=message.from_user.id, action="mass_bonus", amount=amount, affected=affected,
+            details=json.dumps({"active_days": active_days})
+        ))
         await session.commit()
-        
+
     await state.clear()
+    audience = f"активным за {active_days} дн." if active_days else "всем игрокам"
     kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="◀️ В меню", callback_data="admin_back")]])
-    await message.answer(f"✅ Успешно! <b>{amount} ⭐</b> выдано всем игрокам (Охвачено: {len(users)} чел.)!", reply_markup=kb, parse_mode="HTML")
+    await message.answer(f"✅ Успешно! <b>{amount} ⭐</b> выдано {audience} (Охвачено: {affected} чел.)!", reply_markup=kb, parse_mode="HTML")
 
 # --- ПОИСК И УПРАВЛЕНИЕ ЮЗЕРОМ ---
 
@@ -1010,9 +1078,9 @@ async def process_user_search(message: Message, state: FSMContext):
     async with async_session() as session:
         # Ищем по ID или юзернейму
         if query.isdigit():
-            result = await session.execute(select(User).where(User.telegram_id == int(query)))
+            result = await session.execute(queries.user_by_telegram_id(int(query)))
         else:
-            result = await session.execute(select(User).where(User.username.ilike(f"%{query}%")))
+            result = await session.execute(queries.users_by_username(query))
             
         user = result.scalar_one_or_none()
         
@@ -1020,8 +1088,8 @@ async def process_user_search(message: Message, state: FSMContext):
             await message.answer("❌ Пользователь не найден. Попробуй еще раз или нажми /admin")
             return
         
-        # Считаем сколько он открыл кейсов
-        openings = len((await session.execute(select(CaseOpening).where(CaseOpening.user_id == user.id))).scalars().all())
+        # Сколько он открыл кейсов
+        openings = (await get_user_stats(session, user.id)).total_openings
         
         # Сохраняем ID найденного юзера в состояние, чтобы потом менять ему баланс
         await state.update_data(target_user_id=user.telegram_id)
@@ -1064,7 +1132,7 @@ async def process_edit_balance(message: Message, state: FSMContext):
     target_id = data.get("target_user_id")
     
     async with async_session() as session:
-        user = (await session.execute(select(User).where(User.telegram_id == target_id))).scalar_one()
+        user = (await session.execute(queries.user_by_telegram_id(target_id))).scalar_one()
         user.balance += amount
         if user.balance < 0: 
             user.balance = 0 # Защита от отрицательного баланса
@@ -1078,7 +1146,7 @@ async def process_edit_balance(message: Message, state: FSMContext):
 async def admin_reset_free(callback: CallbackQuery):
     target_id = int(callback.data.split("_")[3])
     async with async_session() as session:
-        user = (await session.execute(select(User).where(User.telegram_id == target_id))).scalar_one()
+        user = (await session.execute(queries.user_by_telegram_id(target_id))).scalar_one()
         user.last_free_case = None
         user.free_case_available = True
         await session.commit()
@@ -1094,23 +1162,150 @@ async def admin_broadcast_start(callback: CallbackQuery, state: FSMContext):
 @router.message(AdminState.waiting_for_broadcast)
 async def process_broadcast(message: Message, state: FSMContext):
     await state.clear()
-    await message.answer("⏳ Начинаю рассылку... Это может занять какое-то время.")
-    
-    success = 0
-    failed = 0
-    
+
     async with async_session() as session:
-        users = (await session.execute(select(User))).scalars().all()
-        
-    for user in users:
-        try:
-            # Копируем сообщение админа и отправляем юзеру
-            await message.copy_to(chat_id=user.telegram_id)
-            success += 1
-        except Exception:
-            failed += 1
-            
-    await message.answer(f"✅ <b>Рассылка завершена!</b>\n\nУспешно доставлено: {success}\nЗаблокировали бота: {failed}", parse_mode="HTML")
+        total = await session.scalar(queries.broadcast_recipients_count())
+        job = BroadcastJob(
+            admin_chat_id=message.chat.id, source_chat_id=message.chat.id,
+            source_message_id=message.message_id, total=total or 0
+        )
+        session.add(job)
+        await session.commit()
+
+    progress = await message.answer(
+        f"⏳ Рассылка #{job.id} запущена. Получателей: {job.total}",
+        reply_markup=broadcast_keyboard(job.id)
+    )
+    async with async_session() as session:
+        await session.execute(update(BroadcastJob).where(BroadcastJob.id == job.id).values(progress_message_id=progress.message_id))
+        await session.commit()
+
+    start_broadcast_task(job.id)
+
+
+@router.callback_query(F.data.startswith("bc_cancel_"))
+async def cancel_broadcast(callback: CallbackQuery):
+    if callback.from_user.id not in ADMIN_IDS:
+        # Без answer() клиент крутит «часики» до таймаута
+        return await callback.answer("❌ Доступ запрещен", show_alert=True)
+    job_id = int(callback.data.split("_")[2])
+    async with async_session() as session:
+        await session.execute(
+            update(BroadcastJob).where(BroadcastJob.id == job_id, BroadcastJob.status == "running")
+            .values(status="cancelled", finished_at=datetime.utcnow())
+        )
+        await session.commit()
+    await callback.answer("Рассылка будет остановлена после текущей пачки")
+
+
+# Получатели читаются пачками по users.id; после каждой пачки — чекпоинт в broadcast_jobs,
+# так что после рестарта бота рассылка продолжается с места остановки.
+# Параллельность ограничена размером пачки и воркерами outbound (лимит 30 msg/s соблюдает он).
+BROADCAST_CHUNK = 200
+BROADCAST_PROGRESS_EVERY = 5  # секунд между обновлениями сообщения с прогрессом
+
+_broadcast_tasks: dict[int, asyncio.Task] = {}
+
+
+def broadcast_keyboard(job_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="⛔ Остановить", callback_data=f"bc_cancel_{job_id}")
+    ]])
+
+
+def start_broadcast_task(job_id: int):
+    if job_id in _broadcast_tasks and not _broadcast_tasks[job_id].done():
+        return
+    task = asyncio.create_task(run_broadcast(job_id))
+    _broadcast_tasks[job_id] = task
+    task.add_done_callback(lambda _: _broadcast_tasks.pop(job_id, None))
+
+
+def broadcast_progress_text(job: BroadcastJob) -> str:
+    done = job.sent + job.failed + job.blocked
+    percent = min(100, done * 100 // job.total) if job.total else 100
+    title = {
+        "running": f"⏳ <b>Рассылка #{job.id}</b> — {percent}%",
+        "done": f"✅ <b>Рассылка #{job.id} завершена!</b>",
+        "cancelled": f"⛔ <b>Рассылка #{job.id} остановлена</b> — {percent}%",
+    }.get(job.status, f"Рассылка #{job.id}")
+    return (f"{title}\n\n"
+            f"Успешно доставлено: {job.sent}\n"
+            f"Заблокировали бота: {job.blocked}\n"
+            f"Ошибки: {job.failed}")
+
+
+def update_broadcast_progress(job: BroadcastJob):
+    if not job.progress_message_id: return
+    markup = broadcast_keyboard(job.id) if job.status == "running" else None
+    outbound.submit(lambda: bot.edit_message_text(
+        broadcast_progress_text(job), chat_id=job.admin_chat_id,
+        message_id=job.progress_message_id, parse_mode="HTML", reply_markup=markup
+    ), chat_id=job.admin_chat_id, priority=PRIORITY_NORMAL)
+
+
+async def run_broadcast(job_id: int):
+    async with async_session() as session:
+        job = await session.get(BroadcastJob, job_id)
+    if not job or job.status != "running": return
+    last_progress = 0.0
+
+    # Отмена задачи при остановке бота оставляет статус running — продолжим при следующем старте
+    while True:
+        async with async_session() as session:
+            rows = (await session.execute(queries.broadcast_recipients(job.last_user_id, BROADCAST_CHUNK))).all()
+        if not rows: break
+
+        futures = [
+            outbound.submit(lambda chat_id=tg_id: bot.copy_message(
+                chat_id=chat_id, from_chat_id=job.source_chat_id, message_id=job.source_message_id
+            ), chat_id=tg_id, priority=PRIORITY_BULK)
+            for _, tg_id in rows
+        ]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+
+        blocked_ids = [uid for (uid, _), r in zip(rows, results) if isinstance(r, TelegramForbiddenError)]
+        sent = sum(1 for r in results if not isinstance(r, BaseException))
+        failed = len(results) - sent - len(blocked_ids)
+
+        async with async_session() as session:
+            if blocked_ids:
+                await session.execute(update(User).where(User.id.in_(blocked_ids)).values(is_blocked=True))
+            await session.execute(
+                update(BroadcastJob).where(BroadcastJob.id == job_id).values(
+                    last_user_id=rows[-1].id,
+                    sent=BroadcastJob.sent + sent,
+                    failed=BroadcastJob.failed + failed,
+                    blocked=BroadcastJob.blocked + len(blocked_ids),
+                )
+            )
+            await session.commit()
+            job = await session.get(BroadcastJob, job_id, populate_existing=True)
+
+        if job.status != "running":  # остановлена кнопкой
+            break
+        if time.monotonic() - last_progress >= BROADCAST_PROGRESS_EVERY:
+            last_progress = time.monotonic()
+            update_broadcast_progress(job)
+
+    async with async_session() as session:
+        await session.execute(
+            update(BroadcastJob).where(BroadcastJob.id == job_id, BroadcastJob.status == "running")
+            .values(status="done", finished_at=datetime.utcnow())
+        )
+        await session.commit()
+        job = await session.get(BroadcastJob, job_id, populate_existing=True)
+    update_broadcast_progress(job)
+    print(f"[BROADCAST] #{job_id} {job.status}: sent={job.sent} blocked={job.blocked} failed={job.failed}")
+
+
+async def resume_broadcasts():
+    """Продолжает рассылки, прерванные рестартом бота."""
+    async with async_session() as session:
+        job_ids = (await session.execute(queries.running_broadcasts())).scalars().all()
+    for job_id in job_ids:
+        print(f"[BROADCAST] Возобновляю рассылку #{job_id}")
+        start_broadcast_task(job_id)
 
 @router.callback_query(F.data == "admin_reset_my_free")
 async def admin_reset_my_free_handler(callback: CallbackQuery):
@@ -1119,7 +1314,7 @@ async def admin_reset_my_free_handler(callback: CallbackQuery):
     
     async with async_session() as session:
         result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
+            queries.user_by_telegram_id(callback.from_user.id)
         )
         user = result.scalar_one_or_none()
         
@@ -1199,7 +1394,7 @@ async def set_stars(message: Message):
 
     async with async_session() as session:
         result = await session.execute(
-            select(User).where(User.telegram_id == target_telegram_id)
+            queries.user_by_telegram_id(target_telegram_id)
         )
         user = result.scalar_one_or_none()
         if not user:
@@ -1238,7 +1433,14 @@ async def main():
     print("⚙️  Press Ctrl+C to stop")
     print("=" * 60)
 
-    await dp.start_polling(bot)
+    await outbound.start()
+    await resume_broadcasts()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        for task in list(_broadcast_tasks.values()): task.cancel()
+        await asyncio.gather(*_broadcast_tasks.values(), return_exceptions=True)
+        await outbound.stop()
 
 
 def start_bot():
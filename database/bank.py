@@ -0,0 +1,72 @@
+"""
+Банк заведения (house_bank): общий для всех воркеров лимит риска игр.
+
+Источник правды — строка в БД, которая меняется атомарным
+UPDATE ... SET balance = balance + :delta в той же транзакции, что и сама игра.
+Для горячих проверок (mines_click) значение читается из памяти: локальные изменения
+применяются сразу после коммита, а чужие подтягиваются периодической сверкой
+(reconcile_banks_loop), так что расхождение между воркерами ограничено интервалом сверки.
+"""
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from database.models import async_session, HouseBank
+
+# Стартовые балансы банков (создаются, если строки еще нет)
+HOUSE_BANK_DEFAULTS = {"mines": 10000}
+BANK_RECONCILE_INTERVAL = 10  # секунд
+
+_cached: dict[str, int] = {}
+
+
+async def init_banks():
+    """Создает недостающие строки банков и заполняет кэш."""
+    async with async_session() as session:
+        existing = set((await session.execute(select(HouseBank.name))).scalars())
+        for name, balance in HOUSE_BANK_DEFAULTS.items():
+            if name in existing: continue
+            try:
+                async with session.begin_nested():
+                    session.add(HouseBank(name=name, balance=balance))
+            except IntegrityError:
+                pass  # строку уже создал другой воркер
+        await session.commit()
+    await refresh_banks()
+
+
+async def refresh_banks():
+    async with async_session() as session:
+        for name, balance in (await session.execute(select(HouseBank.name, HouseBank.balance))).all():
+            _cached[name] = balance
+
+
+def bank_balance(name: str) -> int:
+    """Значение из памяти (без запроса к БД)."""
+    return _cached.get(name, HOUSE_BANK_DEFAULTS.get(name, 0))
+
+
+async def adjust_bank(session, name: str, delta: int):
+    """Атомарный сдвиг банка в транзакции вызывающего; после коммита вызовите apply_bank_delta."""
+    if not delta: return
+    await session.execute(
+        update(HouseBank).where(HouseBank.name == name)
+        .values(balance=HouseBank.balance + delta, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def apply_bank_delta(name: str, delta: int):
+    """Отражает закоммиченное изменение в локальном кэше до следующей сверки."""
+    _cached[name] = bank_balance(name) + delta
+
+
+async def reconcile_banks_loop(interval: float = BANK_RECONCILE_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_banks()
+        except Exception as e:
+            print(f"[BANK] Ошибка сверки: {e}")
@@ -0,0 +1,145 @@
+"""
+Нагрузочный тест SQLite: конкурентные чтения и записи из нескольких процессов
+(как бот, админ-бот и сервер на одном файле) без профиля и с профилем database/sqlite_profile.py.
+
+Читатель — игрок по telegram_id и страница его игр; писатель — ставка в кости
+(UPDATE баланса + INSERT dice_games в одной транзакции). Каждый режим запускается на
+новом файле базы. В отчете — операций в секунду, p99 задержки и число ошибок «database is locked».
+Режим «по умолчанию» повторяет настройку до профиля: журнал DELETE и timeout=0. Задержки
+считаются только по успешным операциям: с профилем писатель ждет блокировку (busy_timeout)
+и его p99 выше, без профиля такие записи просто падают и в p99 не попадают.
+
+    python database/bench_sqlite.py
+    python database/bench_sqlite.py --processes 3 --readers 8 --writers 2 --seconds 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from sqlalchemy import desc, insert, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from database.models import Base, User, DiceGame
+from database.sqlite_profile import apply_sqlite_profile
+
+SEED_BATCH = 5000
+
+
+def _engine(path: str, tuned: bool):
+    if tuned:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        apply_sqlite_profile(engine)
+        return engine
+    # Как до профиля: журнал по умолчанию (DELETE) и без ожидания блокировки — иначе
+    # 5-секундный timeout модуля sqlite3 по умолчанию прячет конкуренцию писателей
+    return create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"timeout": 0})
+
+
+async def _seed(path: str, users: int, tuned: bool):
+    engine = _engine(path, tuned)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for start in range(0, users, SEED_BATCH):
+            await conn.execute(insert(User), [
+                {"telegram_id": 1_000_000 + i, "first_name": f"P{i}", "balance": 1_000_000}
+                for i in range(start, min(users, start + SEED_BATCH))
+            ])
+    await engine.dispose()
+
+
+async def _run(path: str, tuned: bool, readers: int, writers: int, seconds: float, users: int) -> dict:
+    engine = _engine(path, tuned)
+    deadline = time.perf_counter() + seconds
+    stats = {"read": [], "write": [], "locked": 0}
+
+    async def reader():
+        while time.perf_counter() < deadline:
+            uid = random.randint(1, users)
+            t = time.perf_counter()
+            try:
+                async with engine.connect() as conn:
+                    await conn.execute(select(User).where(User.telegram_id == 1_000_000 + uid - 1))
+                    await conn.execute(select(DiceGame).where(DiceGame.user_id == uid).order_by(desc(DiceGame.id)).limit(20))
+            except OperationalError as e:
+                if "locked" not in str(e): raise
+                stats["locked"] += 1
+                continue
+            stats["read"].append(time.perf_counter() - t)
+
+    async def writer():
+        while time.perf_counter() < deadline:
+            uid = random.randint(1, users)
+            t = time.perf_counter()
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(update(User).where(User.id == uid).values(balance=User.balance - 10))
+                    await conn.execute(insert(DiceGame).values(
+                        user_id=uid, bet=10, chance=50, roll_type="under", roll_result=random.randint(0, 999999), win_amount=0
+                    ))
+            except OperationalError as e:
+                if "locked" not in str(e): raise
+                stats["locked"] += 1
+                continue
+            stats["write"].append(time.perf_counter() - t)
+
+    await asyncio.gather(*[reader() for _ in range(readers)], *[writer() for _ in range(writers)])
+    await engine.dispose()
+    return stats
+
+
+def _process(args) -> dict:
+    return asyncio.run(_run(*args))
+
+
+def _p99(values: list[float]) -> float:
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.99))] * 1000
+
+
+def bench(tuned: bool, processes: int, readers: int, writers: int, seconds: float, users: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        asyncio.run(_seed(path, users, tuned))
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(processes, mp_context=ctx) as pool:
+            results = list(pool.map(_process, [(path, tuned, readers, writers, seconds, users)] * processes))
+    reads = [x for r in results for x in r["read"]]
+    writes = [x for r in results for x in r["write"]]
+    return {
+        "reads/s": len(reads) / seconds, "writes/s": len(writes) / seconds,
+        "read p99, ms": _p99(reads), "write p99, ms": _p99(writes),
+        "locked": sum(r["locked"] for r in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк SQLite с профилем и без")
+    parser.add_argument("--processes", type=int, default=3, help="процессов (бот, админ-бот, сервер)")
+    parser.add_argument("--readers", type=int, default=8, help="читающих задач на процесс")
+    parser.add_argument("--writers", type=int, default=2, help="пишущих задач на процесс")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--users", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rows = {}
+    for name, tuned in (("по умолчанию", False), ("профиль", True)):
+        print(f"⏱ {name}...", file=sys.stderr)
+        rows[name] = bench(tuned, args.processes, args.readers, args.writers, args.seconds, args.users)
+
+    print(f"{'':<15}" + "".join(f"{name:>15}" for name in rows))
+    for metric in next(iter(rows.values())):
+        print(f"{metric:<15}" + "".join(f"{row[metric]:>15.1f}" for row in rows.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Планы выполнения горячих запросов server.py, bot/main.py и database/stats.py.
+
+Запросы строятся теми же функциями database/queries.py, что вызывают обработчики (имя
+обработчика — в заголовке), так что проверяется ровно тот SQL, который уходит в базу.
+По умолчанию схема берется из моделей (create_all во временной SQLite в памяти), так что
+скрипт проверяет именно набор индексов в models.py; с --url — план на реальной базе
+(миграции не запускаются).
+
+Полный проход по таблице (SQLite «SCAN table» без индекса, Postgres «Seq Scan») помечается ⚠️,
+кроме справочников и админских запросов из списка scan_ok. На Postgres планы строятся с
+enable_seqscan=off: на маленькой тестовой базе планировщик иначе всегда выбирает Seq Scan.
+
+    python database/explain_queries.py
+    python database/explain_queries.py --check                    # код выхода 1 при полном проходе
+    python database/explain_queries.py --url sqlite+aiosqlite:///./database/cases.db
+"""
+import argparse
+import asyncio
+import re
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from database import queries
+from database.models import Base, MinesGame
+
+# Справочники: десятки-сотни строк, полный проход дешевле индекса
+CATALOG_TABLES = {"cases", "gifts", "house_bank", "broadcast_jobs"}
+
+_SQLITE_SCAN = re.compile(r"\bSCAN (\w+)\b(?! USING)")
+_PG_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+@dataclass
+class Query:
+    source: str
+    statement: object
+    scan_ok: set[str] = field(default_factory=set)
+
+
+def hot_queries() -> list[Query]:
+    tg_id, user_id, case_id, promo_id = 123456789, 1, 1, 1
+    cursor = (datetime(2024, 1, 1), 1000)
+    since = datetime.utcnow() - timedelta(days=7)
+    sellable = queries.sellable_openings(user_id)
+
+    return [
+        # ─── server.py ────────────────────────────────────────────────────────
+        Query("server: игрок по telegram_id (почти каждый обработчик)", queries.user_by_telegram_id(tg_id)),
+        Query("server.init_user: реферер по коду", queries.user_by_referral_code('ref_abc')),
+        Query("server.LiveDropFeed.warm", queries.recent_drops(20)),
+        Query("server.LiveDropFeed.poll", queries.drops_after(1000, 20)),
+        Query("server.list_cases", queries.active_cases()),
+        Query("server.open_case / get_case_items", queries.case_items(case_id)),
+        Query("server.get_inventory (страница с курсором)", queries.inventory_page(user_id, 50, cursor)),
+        Query("server.withdraw_item: заявка в ожидании", queries.pending_withdrawal(1)),
+        Query("server.sell_bulk: сумма продажи", queries.sell_totals(sellable)),
+        Query("server.sell_bulk: пометка проданных", queries.mark_sold(sellable)),
+        Query("server.withdraw_referrals", queries.claim_referral_earnings(user_id)),
+        Query("server.get_referrals", queries.referrals_page(user_id, 20, cursor)),
+        Query("server.create_invoice / get_promo: промокод по коду", queries.active_promo_by_code('SUMMER')),
+        Query("server.create_invoice: код уже активирован", queries.promo_usage(user_id, promo_id)),
+        Query("server.load_mines_state", queries.active_mines_game(tg_id)),
+        Query("server.mines_start: сжигание прошлой игры",
+              queries.close_mines_games('forfeit', MinesGame.user_id == user_id)),
+        Query("server.mines_click / mines_collect", queries.mines_move(1, 0, step=1)),
+        Query("server.sweep_abandoned_mines", queries.idle_mines_games(since, 500)),
+        Query("server.GiftCatalog.reload", queries.upgrade_catalog_gifts()),
+        Query("server.upgrade_bet: выбранные предметы", queries.openings_by_ids([1, 2, 3])),
+
+        # ─── database/stats.py (пересчет user_stats) ──────────────────────────
+        Query("stats: инвентарь", queries.inventory_totals(user_id)),
+        Query("stats: всего открытий", queries.openings_count(user_id)),
+        Query("stats: рефералы", queries.referrals_count(user_id)),
+        Query("stats: депозиты", queries.deposits_sum(user_id)),
+        Query("stats: доступный реферальный доход", queries.available_referral_earnings(user_id)),
+
+        # ─── bot/main.py ──────────────────────────────────────────────────────
+        Query("bot: выводы игрока (профиль, карточка)", queries.user_withdrawals_count(user_id, "completed")),
+        Query("bot: очередь заявок на вывод", queries.pending_withdrawals(1, 4)),
+        Query("bot: число заявок в очереди", queries.pending_withdrawals_count()),
+        Query("bot: история выводов (админка)", queries.processed_withdrawals(5), scan_ok={"withdrawals"}),
+        Query("bot: список игроков (админка)", queries.users_page(10, 0), scan_ok={"users"}),
+        Query("bot: поиск игрока по username (админка, LIKE '%…%')", queries.users_by_username("durov"),
+              scan_ok={"users"}),
+        Query("bot: топ предметов игрока", queries.top_inventory_gifts(user_id, 3)),
+        Query("bot: массовый бонус активным за N дней", queries.mass_bonus(100, since), scan_ok={"users"}),
+        Query("bot: получатели рассылки (старт рассылки)", queries.broadcast_recipients_count(), scan_ok={"users"}),
+        Query("bot: пачка рассылки", queries.broadcast_recipients(1000, 200)),
+        Query("bot: незавершенные рассылки", queries.running_broadcasts()),
+        Query("bot: последние промокоды (админка)", queries.recent_promos(10), scan_ok={"promo_codes"}),
+    ]
+
+
+async def explain(conn, query: Query) -> tuple[list[str], list[str]]:
+    """Строки плана и таблицы, которые читаются полным проходом (без учета разрешенных)."""
+    sql = str(query.statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "sqlite":
+        plan = [row[3] for row in (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")).all()]
+        pattern = _SQLITE_SCAN
+    else:
+        await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        plan = [row[0] for row in (await conn.exec_driver_sql(f"EXPLAIN {sql}")).all()]
+        pattern = _PG_SCAN
+    allowed = CATALOG_TABLES | query.scan_ok
+    scans = [m.group(1) for line in plan for m in pattern.finditer(line) if m.group(1) not in allowed]
+    return plan, scans
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN горячих запросов")
+    parser.add_argument("--url", help="база для проверки (по умолчанию — схема моделей в SQLite в памяти)")
+    parser.add_argument("--check", action="store_true", help="код выхода 1, если есть полный проход")
+    args = parser.parse_args()
+
+    engine = create_async_engine(args.url or "sqlite+aiosqlite://")
+    problems = []
+    try:
+        if not args.url:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+        for query in hot_queries():
+            async with engine.connect() as conn:  # транзакция откатывается при выходе (и SET LOCAL вместе с ней)
+                plan, scans = await explain(conn, query)
+            print(f"{'⚠️' if scans else '✅'} {query.source}")
+            for line in plan: print(f"     {line}")
+            problems += [f"{query.source}: полный проход {table}" for table in scans]
+    finally:
+        await engine.dispose()
+
+    print()
+    for p in problems: print(f"❌ {p}", file=sys.stderr)
+    if not problems: print("✅ Горячие запросы идут по индексам")
+    if args.check and problems: sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,176 @@
+"""
+Версионные миграции схемы.
+
+Номер примененной версии хранится в таблице schema_version (строка на каждую миграцию).
+Миграции — модули database/migrations/mNNNN_<имя>.py с функцией async def upgrade(conn),
+применяются строго по порядку и ровно один раз.
+
+При каждом старте под блокировкой (Postgres — pg_advisory_xact_lock, SQLite — запись первым
+же оператором, аналог BEGIN IMMEDIATE) create_all создает недостающие таблицы — он
+идемпотентен, так что новая таблица модели появляется и на базе последней версии. Затем
+SELECT MAX(version): если база уже на последней версии, больше ничего не выполняется, иначе
+по одной транзакции на миграцию применяются недостающие версии. Параллельно стартующие
+воркеры ждут блокировку и, перечитав версию, ничего не повторяют.
+
+Вручную:
+    python database/migrate.py            # применить недостающие миграции
+    python database/migrate.py --status   # текущая и последняя версия
+"""
+import argparse
+import asyncio
+import importlib
+import pkgutil
+import re
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+MIGRATIONS_PACKAGE = "database.migrations"
+MIGRATION_LOCK_KEY = 7_351_024_001   # ключ pg_advisory_xact_lock
+BACKFILL_BATCH = 5000                # строк в одном UPDATE при заполнении старых данных
+
+SCHEMA_VERSION_DDL = (
+    "CREATE TABLE IF NOT EXISTS schema_version ("
+    "version INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+)
+
+_MODULE_RE = re.compile(r"^m(\d{4})_(\w+)$")
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[..., Awaitable[None]]
+
+
+def load_migrations() -> list[Migration]:
+    package = importlib.import_module(MIGRATIONS_PACKAGE)
+    migrations = []
+    for info in pkgutil.iter_modules(package.__path__):
+        match = _MODULE_RE.match(info.name)
+        if not match: continue
+        module = importlib.import_module(f"{MIGRATIONS_PACKAGE}.{info.name}")
+        migrations.append(Migration(int(match.group(1)), match.group(2), module.upgrade))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Повторяющиеся номера миграций: {versions}")
+    return migrations
+
+
+# ═══════════════════════════════════════════════════════════════
+# ПОМОЩНИКИ ДЛЯ МИГРАЦИЙ
+# ═══════════════════════════════════════════════════════════════
+
+async def column_names(conn, table: str) -> set[str]:
+    return await conn.run_sync(lambda sync_conn: {c["name"] for c in inspect(sync_conn).get_columns(table)})
+
+
+async def add_column(conn, table: str, column: str, ddl: str) -> bool:
+    """ALTER TABLE ... ADD COLUMN, только если колонки еще нет. True — колонка добавлена."""
+    if column in await column_names(conn, table): return False
+    await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+
+async def create_index(conn, name: str, table: str, columns: str, unique: bool = False):
+    await conn.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+async def backfill(conn, table: str, set_clause: str, where: str, batch: int = BACKFILL_BATCH) -> int:
+    """
+    UPDATE table SET set_clause WHERE where — пачками по batch строк (по первичному ключу id),
+    чтобы на больших таблицах ни один оператор не переписывал всю таблицу разом.
+    Условие должно перестать выполняться после обновления строки, иначе цикл не закончится.
+    """
+    total = 0
+    while True:
+        result = await conn.execute(text(
+            f"UPDATE {table} SET {set_clause} WHERE id IN (SELECT id FROM {table} WHERE {where} LIMIT :batch)"
+        ), {"batch": batch})
+        total += result.rowcount
+        if result.rowcount < batch: return total
+
+
+# ═══════════════════════════════════════════════════════════════
+# ЗАПУСК
+# ═══════════════════════════════════════════════════════════════
+
+async def _current_version(conn) -> int:
+    return (await conn.execute(text("SELECT MAX(version) FROM schema_version"))).scalar() or 0
+
+
+async def current_version(engine) -> int:
+    """Версия схемы; 0 — таблицы schema_version еще нет (новая база или база до миграций)."""
+    try:
+        async with engine.connect() as conn:
+            return await _current_version(conn)
+    except DBAPIError:
+        return 0
+
+
+async def _lock(conn):
+    """Эксклюзивная блокировка миграций до конца текущей транзакции."""
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    else:
+        # SQLite: первая же запись берет RESERVED-блокировку на всю базу (как BEGIN IMMEDIATE),
+        # второй процесс ждет ее здесь, а не падает на середине миграции
+        await conn.execute(text("DELETE FROM schema_version WHERE version < 0"))
+
+
+async def migrate(engine, metadata) -> int:
+    """Доводит схему до последней версии и возвращает ее номер."""
+    migrations = load_migrations()
+    latest = migrations[-1].version if migrations else 0
+
+    # create_all — при каждом старте: новая таблица модели не требует номера версии
+    async with engine.begin() as conn:
+        await conn.execute(text(SCHEMA_VERSION_DDL))
+    async with engine.begin() as conn:
+        await _lock(conn)
+        await conn.run_sync(metadata.create_all)
+
+    current = await current_version(engine)
+    if current >= latest: return current
+
+    for migration in migrations:
+        if migration.version <= current: continue
+        async with engine.begin() as conn:
+            await _lock(conn)
+            if await _current_version(conn) >= migration.version: continue  # применил другой процесс
+            print(f"🗄 Миграция {migration.version:04d} {migration.name}")
+            await migration.upgrade(conn)
+            await conn.execute(
+                text("INSERT INTO schema_version (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                {"version": migration.version, "name": migration.name, "applied_at": datetime.utcnow()}
+            )
+    return latest
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument("--status", action="store_true", help="только показать версии")
+    args = parser.parse_args()
+
+    from database.models import engine, Base
+    try:
+        latest = load_migrations()[-1].version
+        if args.status:
+            print(f"Версия схемы: {await current_version(engine)}, последняя: {latest}")
+        else:
+            print(f"✅ Схема на версии {await migrate(engine, Base.metadata)}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
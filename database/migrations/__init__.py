@@ -0,0 +1,10 @@
+"""
+Миграции схемы (запускает database/migrate.py).
+
+Файл mNNNN_<имя>.py с функцией async def upgrade(conn) — conn уже в транзакции и под
+блокировкой миграций. Новая колонка, индекс или перенос данных — новый файл со следующим
+номером; уже выпущенные миграции не меняются. Новые таблицы создаст create_all при каждом
+старте (номер версии для них не нужен), а колонки и индексы нужно добавлять и в модель, и в
+миграцию: на новой базе create_all создает их сам, поэтому миграции пишутся идемпотентно
+(add_column, IF NOT EXISTS).
+"""
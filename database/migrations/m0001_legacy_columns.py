@@ -0,0 +1,21 @@
+"""Колонки, которые раньше добавлял init_db, и заполнение старых NULL в булевых флагах."""
+from database.migrate import add_column, backfill, create_index
+
+
+async def upgrade(conn):
+    await add_column(conn, "referral_earnings", "is_withdrawn", "BOOLEAN DEFAULT FALSE")
+    await add_column(conn, "case_openings", "is_sold", "BOOLEAN DEFAULT FALSE")
+    await add_column(conn, "users", "photo_url", "TEXT")
+    await add_column(conn, "users", "referrer_id", "INTEGER")
+    await add_column(conn, "users", "referral_code", "TEXT")
+    await add_column(conn, "payments", "bonus_amount", "INTEGER DEFAULT 0")
+    await add_column(conn, "payments", "promo_id", "INTEGER")
+
+    # Бывший migration_add_gift_number.sql: номер TGS-анимации подарка. Сами номера
+    # проставляет database/init_db.py из GIFTS_CATALOG
+    await add_column(conn, "gifts", "gift_number", "INTEGER")
+    await create_index(conn, "idx_gifts_gift_number", "gifts", "gift_number")
+
+    # Строки, созданные до появления колонок
+    await backfill(conn, "referral_earnings", "is_withdrawn = FALSE", "is_withdrawn IS NULL")
+    await backfill(conn, "case_openings", "is_sold = FALSE", "is_sold IS NULL")
@@ -0,0 +1,15 @@
+"""Счетчики user_stats. Если колонки пришлось добавлять, старые строки неполные — удаляем их,
+они пересчитаются из исходных таблиц при первом обращении."""
+from sqlalchemy import text
+
+from database.migrate import add_column
+
+STATS_COLUMNS = ("total_openings", "total_referrals", "total_deposits", "referral_earnings_available")
+
+
+async def upgrade(conn):
+    added = False
+    for column in STATS_COLUMNS:
+        added |= await add_column(conn, "user_stats", column, "INTEGER NOT NULL DEFAULT 0")
+    if added:
+        await conn.execute(text("DELETE FROM user_stats"))
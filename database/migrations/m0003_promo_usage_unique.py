@@ -0,0 +1,12 @@
+"""Одна активация промокода на игрока: убираем исторические дубли, иначе уникальный индекс не создастся."""
+from sqlalchemy import text
+
+from database.migrate import create_index
+
+
+async def upgrade(conn):
+    await conn.execute(text(
+        "DELETE FROM promo_code_usages WHERE id NOT IN "
+        "(SELECT MIN(id) FROM promo_code_usages GROUP BY user_id, promo_id)"
+    ))
+    await create_index(conn, "uq_promo_code_usages_user_promo", "promo_code_usages", "user_id, promo_id", unique=True)
@@ -0,0 +1,10 @@
+"""Индексы для инвентаря, выводов и рефералов (на новых базах их создает create_all)."""
+from database.migrate import create_index
+
+
+async def upgrade(conn):
+    await create_index(conn, "idx_case_openings_inventory", "case_openings", "user_id, is_sold, is_withdrawn, created_at")
+    await create_index(conn, "idx_withdrawals_opening", "withdrawals", "opening_id, created_at")
+    await create_index(conn, "idx_users_referrer", "users", "referrer_id, created_at")
+    await create_index(conn, "idx_referral_earnings_referred", "referral_earnings", "referrer_id, referred_user_id")
+    await create_index(conn, "idx_referral_earnings_unwithdrawn", "referral_earnings", "referrer_id, is_withdrawn")
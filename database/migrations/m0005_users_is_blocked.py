@@ -0,0 +1,6 @@
+"""Флаг «заблокировал бота» для пропуска таких игроков в рассылках."""
+from database.migrate import add_column
+
+
+async def upgrade(conn):
+    await add_column(conn, "users", "is_blocked", "BOOLEAN DEFAULT FALSE")
@@ -0,0 +1,9 @@
+"""Мины: битовые маски поля, исход игры и индекс для уборщика брошенных игр."""
+from database.migrate import add_column, create_index
+
+
+async def upgrade(conn):
+    await add_column(conn, "mines_games", "mines_mask", "INTEGER")
+    await add_column(conn, "mines_games", "clicked_mask", "INTEGER")
+    await add_column(conn, "mines_games", "outcome", "TEXT")
+    await create_index(conn, "idx_mines_games_active", "mines_games", "is_active, created_at")
@@ -0,0 +1,27 @@
+"""Индексы под горячие запросы (обоснование — в комментариях к __table_args__ моделей,
+проверка планов — database/explain_queries.py)."""
+from sqlalchemy import inspect
+
+from database.migrate import create_index
+
+
+def _referral_code_indexed(sync_conn) -> bool:
+    inspector = inspect(sync_conn)
+    indexed = [i["column_names"] for i in inspector.get_indexes("users")]
+    indexed += [u["column_names"] for u in inspector.get_unique_constraints("users")]
+    return any(cols and cols[0] == "referral_code" for cols in indexed)
+
+
+async def upgrade(conn):
+    await create_index(conn, "idx_case_items_case", "case_items", "case_id")
+    await create_index(conn, "idx_case_openings_user_created", "case_openings", "user_id, created_at")
+    await create_index(conn, "idx_case_openings_created", "case_openings", "created_at, id")
+    await create_index(conn, "idx_withdrawals_status", "withdrawals", "status, created_at")
+    await create_index(conn, "idx_withdrawals_user_status", "withdrawals", "user_id, status")
+    await create_index(conn, "idx_payments_user_status", "payments", "user_id, status")
+    await create_index(conn, "idx_mines_games_user_active", "mines_games", "user_id, is_active")
+
+    # В старых базах referral_code добавлялся через ALTER без UNIQUE — поиск реферера по коду
+    # шел полным проходом. Уникальный индекс там мог бы упасть на дублях, поэтому обычный
+    if not await conn.run_sync(_referral_code_indexed):
+        await create_index(conn, "idx_users_referral_code", "users", "referral_code")
@@ -0,0 +1,11 @@
+"""Мины: время последнего хода — чистильщик отсчитывает TTL от него, а не от старта игры."""
+from sqlalchemy import text
+
+from database.migrate import add_column, backfill, create_index
+
+
+async def upgrade(conn):
+    await add_column(conn, "mines_games", "updated_at", "TIMESTAMP")
+    await backfill(conn, "mines_games", "updated_at = created_at", "updated_at IS NULL AND created_at IS NOT NULL")
+    await conn.execute(text("DROP INDEX IF EXISTS idx_mines_games_active"))
+    await create_index(conn, "idx_mines_games_idle", "mines_games", "is_active, updated_at")
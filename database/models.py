@@ -1,10 +1,13 @@
-from sqlalchemy import Column, BigInteger, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, text
+from sqlalchemy import Column, BigInteger, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Index
 from sqlalchemy.ext.asyncio import AsyncAttrs, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, relationship
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 
+from database.migrate import migrate
+from database.sqlite_profile import apply_sqlite_profile, tuning_enabled
+
 load_dotenv()
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -26,11 +29,17 @@ class User(Base):
     referrer_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     referral_code = Column(String(50), unique=True, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    is_blocked = Column(Boolean, default=False)  # Заблокировал бота (403 при рассылке) — рассылки его пропускают
 
     openings = relationship("CaseOpening", back_populates="user")
     withdrawals = relationship("Withdrawal", back_populates="user")
     referral_earnings = relationship("ReferralEarning", foreign_keys="ReferralEarning.referrer_id", back_populates="user")
 
+    __table_args__ = (
+        # Список рефералов: WHERE referrer_id ORDER BY created_at DESC (keyset-пагинация)
+        Index("idx_users_referrer", "referrer_id", "created_at"),
+    )
+
 class ReferralEarning(Base):
     __tablename__ = "referral_earnings"
 
@@ -45,6 +54,13 @@ class ReferralEarning(Base):
     user = relationship("User", foreign_keys=[referrer_id], back_populates="referral_earnings")
     referred_user = relationship("User", foreign_keys=[referred_user_id])
 
+    __table_args__ = (
+        # Сумма заработка по каждому рефералу (GROUP BY в get_referrals)
+        Index("idx_referral_earnings_referred", "referrer_id", "referred_user_id"),
+        # Невыведенный доход реферера (выплата в withdraw_referrals)
+        Index("idx_referral_earnings_unwithdrawn", "referrer_id", "is_withdrawn"),
+    )
+
 class Case(Base):
     __tablename__ = "cases"
     
@@ -74,6 +90,10 @@ class Gift(Base):
     
     case_items = relationship("CaseItem", back_populates="gift")
 
+    __table_args__ = (
+        Index("idx_gifts_gift_number", "gift_number"),
+    )
+
 class CaseItem(Base):
     __tablename__ = "case_items"
     
@@ -85,6 +105,11 @@ class CaseItem(Base):
     case = relationship("Case", back_populates="items")
     gift = relationship("Gift", back_populates="case_items")
 
+    __table_args__ = (
+        # Содержимое кейса: open_case, get_case_items
+        Index("idx_case_items_case", "case_id"),
+    )
+
 class CaseOpening(Base):
     __tablename__ = "case_openings"
     
@@ -100,6 +125,15 @@ class CaseOpening(Base):
     case = relationship("Case", back_populates="openings")
     gift = relationship("Gift")
 
+    __table_args__ = (
+        # Инвентарь: WHERE user_id, is_sold, is_withdrawn ORDER BY created_at — без сортировки всей выборки
+        Index("idx_case_openings_inventory", "user_id", "is_sold", "is_withdrawn", "created_at"),
+        # Открытия игрока за период: EXISTS в массовом бонусе, счетчик открытий в пересчете user_stats
+        Index("idx_case_openings_user_created", "user_id", "created_at"),
+        # Лента последних дропов: ORDER BY created_at DESC, id DESC LIMIT (LiveDropFeed.warm)
+        Index("idx_case_openings_created", "created_at", "id"),
+    )
+
 class Withdrawal(Base):
     __tablename__ = "withdrawals"
     
@@ -113,6 +147,15 @@ class Withdrawal(Base):
     user = relationship("User", back_populates="withdrawals")
     opening = relationship("CaseOpening")
 
+    __table_args__ = (
+        # Последний статус вывода по предмету (подзапрос в инвентаре, проверка pending в withdraw_item)
+        Index("idx_withdrawals_opening", "opening_id", "created_at"),
+        # Очередь заявок в админке: WHERE status = 'pending' ORDER BY created_at
+        Index("idx_withdrawals_status", "status", "created_at"),
+        # Выводы игрока в профиле и карточке админки
+        Index("idx_withdrawals_user_status", "user_id", "status"),
+    )
+
 class Payment(Base):
     __tablename__ = "payments"
     
@@ -126,6 +169,11 @@ class Payment(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User")
+
+    __table_args__ = (
+        # Сумма депозитов игрока при пересчете user_stats
+        Index("idx_payments_user_status", "user_id", "status"),
+    )
     
 class MinesGame(Base):
     __tablename__ = "mines_games"
@@ -135,14 +183,26 @@ class MinesGame(Base):
     bet = Column(Integer, nullable=False)
     bombs = Column(Integer, nullable=False)
     step = Column(Integer, default=0)
-    # Храним массивы в виде JSON-строк
+    # Старые игры: массивы в виде JSON-строк
     mines_positions = Column(String(255)) 
     clicked_positions = Column(String(255), default="[]")
+    # Новые игры: поле 5x5 как 25-битные маски (бит i = ячейка i)
+    mines_mask = Column(Integer, nullable=True)
+    clicked_mask = Column(Integer, nullable=True)
     is_active = Column(Boolean, default=True)
+    outcome = Column(String(20), nullable=True)  # win, lose, forfeit (брошена или заменена новой игрой)
     win_amount = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # Последний ход (по нему чистильщик считает игру брошенной)
 
     user = relationship("User")
+
+    __table_args__ = (
+        # Чистильщик брошенных игр: WHERE is_active AND updated_at < ... ORDER BY updated_at
+        Index("idx_mines_games_idle", "is_active", "updated_at"),
+        # Активная игра игрока: load_mines_state, сжигание старой игры в mines_start
+        Index("idx_mines_games_user_active", "user_id", "is_active"),
+    )
 class CrashBet(Base):
     __tablename__ = "crash_bets"
     
@@ -201,6 +261,11 @@ class PromoCodeUsage(Base):
     promo_id = Column(Integer, ForeignKey("promo_codes.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Один игрок — одна активация кода; повтор отсекается на уровне БД
+        Index("uq_promo_code_usages_user_promo", "user_id", "promo_id", unique=True),
+    )
+
 class UpgradeGame(Base):
     __tablename__ = "upgrade_games"
     
@@ -214,7 +279,58 @@ class UpgradeGame(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User")
-    
+
+class UserStats(Base):
+    """Инкрементальные счетчики по игроку (обновляются в тех же транзакциях, что и исходные данные)"""
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    inventory_count = Column(Integer, default=0, nullable=False)  # Предметов в инвентаре (не продано, не выведено)
+    inventory_value = Column(Integer, default=0, nullable=False)  # Их суммарная ценность в звездах
+    total_openings = Column(Integer, default=0, nullable=False)   # Всего открытий (кейсы + апгрейды)
+    total_referrals = Column(Integer, default=0, nullable=False)  # Приглашено игроков
+    total_deposits = Column(Integer, default=0, nullable=False)   # Сумма завершенных пополнений
+    referral_earnings_available = Column(Integer, default=0, nullable=False)  # Невыведенный реферальный доход
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class BroadcastJob(Base):
+    """Рассылка как возобновляемая задача: получатели идут по возрастанию users.id, прогресс — в last_user_id"""
+    __tablename__ = "broadcast_jobs"
+
+    id = Column(Integer, primary_key=True)
+    admin_chat_id = Column(BigInteger, nullable=False)       # Куда писать прогресс
+    progress_message_id = Column(BigInteger, nullable=True)  # Сообщение с прогрессом (редактируется)
+    source_chat_id = Column(BigInteger, nullable=False)      # Откуда копировать сообщение (copy_message)
+    source_message_id = Column(BigInteger, nullable=False)
+    status = Column(String(20), default="running")           # running, done, cancelled
+    last_user_id = Column(Integer, default=0)                # Последний обработанный users.id (чекпоинт)
+    total = Column(Integer, default=0)                       # Получателей на момент старта (для процента)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    blocked = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class HouseBank(Base):
+    """Банк заведения для лимита риска игр (общий для всех воркеров сервера)"""
+    __tablename__ = "house_bank"
+
+    name = Column(String(50), primary_key=True)  # 'mines'
+    balance = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class AuditLog(Base):
+    """Журнал массовых админских операций: одна запись на операцию, а не на каждого затронутого юзера"""
+    __tablename__ = "audit_log"
+
+    id = Column(Integer, primary_key=True)
+    admin_id = Column(BigInteger, nullable=False)  # telegram_id админа
+    action = Column(String(50), nullable=False)    # 'mass_bonus', ...
+    amount = Column(Integer, default=0)
+    affected = Column(Integer, default=0)          # Сколько строк затронуто
+    details = Column(Text)                         # JSON с параметрами (фильтры и т.п.)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./database/cases.db")
 if DATABASE_URL:
     if DATABASE_URL.startswith("postgres://"):
@@ -232,51 +348,9 @@ engine = create_async_engine(
     echo=False,
     connect_args=connect_args
 )
+if tuning_enabled(): apply_sqlite_profile(engine)  # WAL, busy_timeout и т.д. (см. database/sqlite_profile.py)
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
 async def init_db():
-    try:
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-    except Exception as e:
-        print(f"⚠️ Ошибка создания таблиц (игнорируем гонку процессов): {e}")
-    
-    # 1. Сначала жестко создаем колонки...
-    
-    # 1. Сначала жестко создаем колонки с дефолтными значениями (без костылей)
-    try:
-        async with engine.begin() as conn:
-            await conn.execute(text("ALTER TABLE referral_earnings ADD COLUMN is_withdrawn BOOLEAN DEFAULT FALSE"))
-    except Exception:
-        pass # Если уже есть - идем дальше
-        
-    try:
-        async with engine.begin() as conn:
-            await conn.execute(text("ALTER TABLE case_openings ADD COLUMN is_sold BOOLEAN DEFAULT FALSE"))
-    except Exception:
-        pass
-
-    # Остальные текстовые колонки
-    migrations = [
-        ("gifts", "gift_number", "INTEGER"),
-        ("users", "photo_url", "TEXT"),
-        ("users", "referrer_id", "INTEGER"),
-        ("users", "referral_code", "TEXT"),
-        ("payments", "bonus_amount", "INTEGER DEFAULT 0"),
-        ("payments", "promo_id", "INTEGER"),
-    ]
-    for table, col, col_type in migrations:
-        try:
-            async with engine.begin() as conn:
-                await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}"))
-        except Exception:
-            pass
-
-    # 2. ПРЯМАЯ ПРАВКА БАЗЫ ДАННЫХ
-    # Если в базе остались старые пустые (NULL) значения - жестко переводим их в FALSE
-    try:
-        async with engine.begin() as conn:
-            await conn.execute(text("UPDATE referral_earnings SET is_withdrawn = FALSE WHERE is_withdrawn IS NULL"))
-            await conn.execute(text("UPDATE case_openings SET is_sold = FALSE WHERE is_sold IS NULL"))
-    except Exception as e:
-        print(f"⚠️ Ошибка обновления NULL значений: {e}")
\ No newline at end of file
+    """Создает таблицы и применяет недостающие миграции (database/migrations)."""
+    await migrate(engine, Base.metadata)
@@ -0,0 +1,91 @@
+"""
+Промокоды: кэш поиска по коду и атомарный учет активаций.
+
+Кэш хранит только найденные коды (id, тип, значение, лимит) с коротким TTL — промахи не
+кэшируются, поэтому код, только что созданный админом в другом процессе, виден сразу.
+Кэш у каждого процесса свой: изменения существующего кода (например, деактивация)
+доходят до сервера не позже чем через PROMO_CACHE_TTL.
+Счетчик uses_count в кэш не попадает: лимит проверяется условным UPDATE в самой БД,
+а повторная активация одним игроком упирается в уникальный индекс (user_id, promo_id).
+"""
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from database import queries
+from database.models import PromoCode, PromoCodeUsage
+
+PROMO_CACHE_TTL = 60  # секунд
+
+
+@dataclass(frozen=True)
+class CachedPromo:
+    id: int
+    code: str
+    promo_type: str  # 'balance' или 'deposit'
+    value: int
+    uses_limit: int
+
+
+_cache: dict[str, tuple[float, CachedPromo]] = {}
+
+
+async def get_promo(session, code: str) -> CachedPromo | None:
+    """Активный промокод по коду (из кэша, если запись свежая)."""
+    entry = _cache.get(code)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    row = (await session.execute(queries.active_promo_by_code(code))).one_or_none()
+    if row is None:
+        _cache.pop(code, None)
+        return None
+    promo = CachedPromo(row.id, row.code, row.promo_type, row.value, row.uses_limit or 0)
+    _cache[code] = (time.monotonic() + PROMO_CACHE_TTL, promo)
+    return promo
+
+
+async def claim_promo(session, promo_id: int, user_id: int) -> str | None:
+    """
+    Фиксирует активацию промокода игроком в текущей транзакции.
+    Возвращает None при успехе или код ошибки: 'used' — игрок уже активировал,
+    'limit' — лимит исчерпан или код выключен. При ошибке транзакция откатывается.
+    """
+    session.add(PromoCodeUsage(user_id=user_id, promo_id=promo_id))
+    try:
+        await session.flush()
+    except IntegrityError:
+        await session.rollback()
+        return 'used'
+
+    claimed = await session.execute(
+        update(PromoCode)
+        .where(PromoCode.id == promo_id, PromoCode.is_active == True,
+               (PromoCode.uses_limit == 0) | (PromoCode.uses_count < PromoCode.uses_limit))
+        .values(uses_count=PromoCode.uses_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount == 0:
+        await session.rollback()
+        return 'limit'
+    return None
+
+
+async def record_promo_usage(session, promo_id: int, user_id: int) -> bool:
+    """
+    Учет промокода при завершении оплаты: бонус уже обещан в инвойсе, поэтому лимит
+    здесь не проверяется. Повтор (тот же игрок) пропускается через savepoint, не ломая
+    остальную транзакцию платежа. Возвращает True, если использование записано.
+    """
+    try:
+        async with session.begin_nested():
+            session.add(PromoCodeUsage(user_id=user_id, promo_id=promo_id))
+    except IntegrityError:
+        return False
+    await session.execute(
+        update(PromoCode).where(PromoCode.id == promo_id)
+        .values(uses_count=PromoCode.uses_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return True
@@ -0,0 +1,110 @@
+"""
+Массовая генерация промокодов для кампаний.
+
+Коды — префикс + случайный хвост из secrets (без похожих символов O/0, I/1),
+уникальность проверяется пачками против уже существующих кодов, вставка —
+многострочными INSERT по PROMO_INSERT_BATCH строк в одной транзакции.
+
+Из бота: кнопка «📦 Массовая генерация» в меню промокодов (CSV приходит документом).
+Из консоли:
+    python database/promo_gen.py --prefix SUMMER --count 100000 --type balance --value 50 --limit 1 --out summer.csv
+"""
+import argparse
+import asyncio
+import csv
+import io
+import secrets
+import sys
+from pathlib import Path
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from database.models import async_session, PromoCode
+
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+SUFFIX_LENGTH = 8            # 32^8 ≈ 10^12 вариантов на префикс
+MAX_CODE_LENGTH = 50         # PromoCode.code = String(50)
+MAX_BULK_COUNT = 100_000
+PROMO_INSERT_BATCH = 1000    # строк в одном INSERT
+EXISTS_CHECK_BATCH = 500     # кандидатов в одном WHERE code IN (...)
+PROMO_TYPES = ("balance", "deposit")
+
+
+def random_code(prefix: str, length: int = SUFFIX_LENGTH) -> str:
+    return prefix + "".join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+
+
+async def _existing_codes(session, candidates: list[str]) -> set[str]:
+    found = set()
+    for i in range(0, len(candidates), EXISTS_CHECK_BATCH):
+        chunk = candidates[i:i + EXISTS_CHECK_BATCH]
+        found.update((await session.execute(select(PromoCode.code).where(PromoCode.code.in_(chunk)))).scalars())
+    return found
+
+
+async def generate_promo_codes(prefix: str, count: int, promo_type: str, value: int,
+                               uses_limit: int = 1, length: int = SUFFIX_LENGTH) -> list[str]:
+    """Создает count новых уникальных промокодов и возвращает их список."""
+    prefix = prefix.strip().upper()
+    if promo_type not in PROMO_TYPES: raise ValueError(f"Тип промокода: {' / '.join(PROMO_TYPES)}")
+    if not 1 <= count <= MAX_BULK_COUNT: raise ValueError(f"Количество: от 1 до {MAX_BULK_COUNT}")
+    if value <= 0 or uses_limit < 0: raise ValueError("Бонус должен быть > 0, лимит ≥ 0")
+    if len(prefix) + length > MAX_CODE_LENGTH: raise ValueError(f"Код длиннее {MAX_CODE_LENGTH} символов")
+
+    async with async_session() as session:
+        codes: set[str] = set()
+        while len(codes) < count:
+            candidates = set()
+            while len(candidates) < count - len(codes):
+                code = random_code(prefix, length)
+                if code not in codes: candidates.add(code)
+            candidates -= await _existing_codes(session, list(candidates))
+            codes |= candidates
+
+        codes_list = sorted(codes)
+        try:
+            for i in range(0, len(codes_list), PROMO_INSERT_BATCH):
+                await session.execute(insert(PromoCode), [
+                    {"code": code, "promo_type": promo_type, "value": value, "uses_limit": uses_limit,
+                     "uses_count": 0, "is_active": True}
+                    for code in codes_list[i:i + PROMO_INSERT_BATCH]
+                ])
+            await session.commit()
+        except SQLAlchemyError:
+            # Например, IntegrityError: тот же код успел создать другой процесс — пачка целиком откатывается
+            await session.rollback()
+            raise
+    return codes_list
+
+
+def promo_codes_csv(codes: list[str], promo_type: str, value: int, uses_limit: int) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["code", "type", "value", "uses_limit"])
+    writer.writerows((code, promo_type, value, uses_limit) for code in codes)
+    return buf.getvalue().encode("utf-8")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Массовая генерация промокодов")
+    parser.add_argument("--prefix", required=True)
+    parser.add_argument("--count", type=int, required=True)
+    parser.add_argument("--type", dest="promo_type", choices=PROMO_TYPES, default="balance")
+    parser.add_argument("--value", type=int, required=True, help="звезды (balance) или процент (deposit)")
+    parser.add_argument("--limit", type=int, default=1, help="активаций на код, 0 = бесконечно")
+    parser.add_argument("--out", help="файл CSV (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    codes = await generate_promo_codes(args.prefix, args.count, args.promo_type, args.value, args.limit)
+    data = promo_codes_csv(codes, args.promo_type, args.value, args.limit)
+    if args.out:
+        Path(args.out).write_bytes(data)
+        print(f"✅ Создано {len(codes)} промокодов → {args.out}", file=sys.stderr)
+    else:
+        sys.stdout.buffer.write(data)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,316 @@
+"""
+Горячие запросы в одном месте: обработчики server.py, bot/main.py, database/stats.py и
+database/promo.py собирают их здесь, а database/explain_queries.py проверяет планы этих же
+самых выражений. Новый запрос к большой таблице — новая функция здесь и строка в
+explain_queries.hot_queries().
+
+Функции только строят выражения SQLAlchemy и ничего не выполняют.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, desc, func, or_, select, update
+from sqlalchemy.orm import joinedload
+
+from database.models import (
+    User, Case, CaseItem, CaseOpening, Gift, Withdrawal, ReferralEarning, Payment,
+    MinesGame, PromoCode, PromoCodeUsage, BroadcastJob
+)
+
+
+def keyset_before(created_col, id_col, cursor: tuple[datetime, int]):
+    """Условие 'строго после курсора' для сортировки по (created_at DESC, id DESC)."""
+    created_at, row_id = cursor
+    return or_(created_col < created_at, and_(created_col == created_at, id_col < row_id))
+
+
+# ═══════════════════════════════════════════════════════════════
+# ИГРОКИ И РЕФЕРАЛЫ
+# ═══════════════════════════════════════════════════════════════
+
+def user_by_telegram_id(telegram_id: int):
+    return select(User).where(User.telegram_id == telegram_id)
+
+
+def user_by_referral_code(code: str):
+    return select(User).where(User.referral_code == code)
+
+
+def referrals_page(referrer_id: int, limit: int, cursor: tuple[datetime, int] | None = None):
+    """Страница рефералов по idx_users_referrer + их заработок через GROUP BY (limit + 1 строк)."""
+    total_earned = func.coalesce(func.sum(ReferralEarning.amount), 0)
+    query = (
+        select(User, total_earned)
+        .outerjoin(ReferralEarning, and_(
+            ReferralEarning.referrer_id == referrer_id, ReferralEarning.referred_user_id == User.id
+        ))
+        .where(User.referrer_id == referrer_id)
+        # Группировка в порядке индекса — без временных B-деревьев под GROUP BY / ORDER BY
+        .group_by(User.created_at, User.id)
+        .order_by(desc(User.created_at), desc(User.id))
+        .limit(limit + 1)
+    )
+    if cursor:
+        query = query.where(keyset_before(User.created_at, User.id, cursor))
+    return query
+
+
+def claim_referral_earnings(referrer_id: int):
+    """UPDATE ... RETURNING: помечает ровно те начисления, сумма которых зачисляется."""
+    return (
+        update(ReferralEarning)
+        .where(ReferralEarning.referrer_id == referrer_id, ReferralEarning.is_withdrawn == False)
+        .values(is_withdrawn=True)
+        .returning(ReferralEarning.amount)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def users_page(limit: int, offset: int):
+    return select(User).order_by(desc(User.created_at)).limit(limit).offset(offset)
+
+
+def users_by_username(part: str):
+    return select(User).where(User.username.ilike(f"%{part}%"))
+
+
+def mass_bonus(amount: int, active_since: datetime | None = None):
+    """Один UPDATE на всех игроков (или открывавших кейсы после active_since)."""
+    stmt = update(User).values(balance=User.balance + amount)
+    if active_since:
+        stmt = stmt.where(
+            select(CaseOpening.id).where(CaseOpening.user_id == User.id, CaseOpening.created_at >= active_since).exists()
+        )
+    return stmt.execution_options(synchronize_session=False)
+
+
+def broadcast_recipients_count():
+    return select(func.count(User.id)).where(User.is_blocked.isnot(True))
+
+
+def broadcast_recipients(after_user_id: int, limit: int):
+    return (
+        select(User.id, User.telegram_id)
+        .where(User.id > after_user_id, User.is_blocked.isnot(True))
+        .order_by(User.id).limit(limit)
+    )
+
+
+def running_broadcasts():
+    return select(BroadcastJob.id).where(BroadcastJob.status == "running")
+
+
+# ═══════════════════════════════════════════════════════════════
+# КЕЙСЫ, ИНВЕНТАРЬ, ЛЕНТА
+# ═══════════════════════════════════════════════════════════════
+
+def active_cases():
+    return select(Case).where(Case.is_active == True)
+
+
+def case_items(case_id: int):
+    return select(CaseItem).where(CaseItem.case_id == case_id).options(joinedload(CaseItem.gift))
+
+
+def _drops():
+    return (
+        select(CaseOpening, User, Gift)
+        .join(User, CaseOpening.user_id == User.id)
+        .join(Gift, CaseOpening.gift_id == Gift.id)
+    )
+
+
+def recent_drops(limit: int):
+    return _drops().order_by(desc(CaseOpening.created_at), desc(CaseOpening.id)).limit(limit)
+
+
+def drops_after(last_id: int, limit: int):
+    return _drops().where(CaseOpening.id > last_id).order_by(CaseOpening.id).limit(limit)
+
+
+def inventory_page(user_id: int, limit: int, cursor: tuple[datetime, int] | None = None):
+    """
+    Страница инвентаря по idx_case_openings_inventory (limit + 1 строк — признак следующей страницы).
+    Статус последней заявки на вывод — коррелированным подзапросом по idx_withdrawals_opening.
+    """
+    latest_status = (
+        select(Withdrawal.status)
+        .where(Withdrawal.opening_id == CaseOpening.id)
+        .order_by(desc(Withdrawal.created_at), desc(Withdrawal.id))
+        .limit(1).correlate(CaseOpening).scalar_subquery()
+    )
+    query = (
+        select(CaseOpening, latest_status)
+        .where(CaseOpening.user_id == user_id, CaseOpening.is_sold == False, CaseOpening.is_withdrawn == False)
+        .order_by(desc(CaseOpening.created_at), desc(CaseOpening.id))
+        .limit(limit + 1).options(joinedload(CaseOpening.gift))
+    )
+    if cursor:
+        query = query.where(keyset_before(CaseOpening.created_at, CaseOpening.id, cursor))
+    return query
+
+
+def sellable_openings(user_id: int, opening_ids: list[int] | None = None):
+    """Условие «лежит в инвентаре и не ждет вывода» (все предметы игрока или только opening_ids)."""
+    pending_withdrawal = select(Withdrawal.id).where(
+        Withdrawal.opening_id == CaseOpening.id, Withdrawal.status == 'pending'
+    ).exists()
+    sellable = and_(
+        CaseOpening.user_id == user_id, CaseOpening.is_sold == False,
+        CaseOpening.is_withdrawn == False, ~pending_withdrawal
+    )
+    if opening_ids is not None:
+        sellable = and_(sellable, CaseOpening.id.in_(opening_ids))
+    return sellable
+
+
+def sell_totals(condition):
+    return (
+        select(func.count(CaseOpening.id), func.coalesce(func.sum(Gift.value), 0))
+        .join(Gift, CaseOpening.gift_id == Gift.id).where(condition)
+    )
+
+
+def mark_sold(condition):
+    return update(CaseOpening).where(condition).values(is_sold=True).execution_options(synchronize_session=False)
+
+
+def openings_by_ids(opening_ids: list[int]):
+    return select(CaseOpening).where(CaseOpening.id.in_(opening_ids)).options(joinedload(CaseOpening.gift))
+
+
+def top_inventory_gifts(user_id: int, limit: int = 3):
+    return (
+        select(Gift)
+        .join(CaseOpening, CaseOpening.gift_id == Gift.id)
+        .where(CaseOpening.user_id == user_id, CaseOpening.is_sold == False, CaseOpening.is_withdrawn == False)
+        .order_by(desc(Gift.value))
+        .limit(limit)
+    )
+
+
+def upgrade_catalog_gifts():
+    return (
+        select(Gift.id, Gift.name, Gift.value, Gift.image_url, Gift.gift_number)
+        .where(Gift.value > 0).order_by(Gift.value, Gift.id)
+    )
+
+
+# ═══════════════════════════════════════════════════════════════
+# ВЫВОДЫ
+# ═══════════════════════════════════════════════════════════════
+
+def pending_withdrawal(opening_id: int):
+    return select(Withdrawal).where(Withdrawal.opening_id == opening_id, Withdrawal.status == 'pending')
+
+
+def user_withdrawals_count(user_id: int, status: str | None = None):
+    query = select(func.count(Withdrawal.id)).where(Withdrawal.user_id == user_id)
+    return query.where(Withdrawal.status == status) if status else query
+
+
+def pending_withdrawals_count():
+    return select(func.count(Withdrawal.id)).where(Withdrawal.status == 'pending')
+
+
+def pending_withdrawals(limit: int, offset: int = 0):
+    return select(Withdrawal).where(Withdrawal.status == 'pending').order_by(Withdrawal.created_at).limit(limit).offset(offset)
+
+
+def processed_withdrawals_count():
+    return select(func.count(Withdrawal.id)).where(Withdrawal.status != 'pending')
+
+
+def processed_withdrawals(limit: int, offset: int = 0):
+    return (
+        select(Withdrawal).where(Withdrawal.status != 'pending')
+        .order_by(desc(Withdrawal.completed_at)).limit(limit).offset(offset)
+    )
+
+
+# ═══════════════════════════════════════════════════════════════
+# ПРОМОКОДЫ
+# ═══════════════════════════════════════════════════════════════
+
+def active_promo_by_code(code: str):
+    return (
+        select(PromoCode.id, PromoCode.code, PromoCode.promo_type, PromoCode.value, PromoCode.uses_limit)
+        .where(PromoCode.code == code, PromoCode.is_active == True)
+    )
+
+
+def promo_usage(user_id: int, promo_id: int):
+    return select(PromoCodeUsage.id).where(PromoCodeUsage.user_id == user_id, PromoCodeUsage.promo_id == promo_id).limit(1)
+
+
+def recent_promos(limit: int = 10):
+    return select(PromoCode).where(PromoCode.is_active == True).order_by(desc(PromoCode.created_at)).limit(limit)
+
+
+# ═══════════════════════════════════════════════════════════════
+# МИНЫ
+# ═══════════════════════════════════════════════════════════════
+
+def active_mines_game(telegram_id: int):
+    return (
+        select(MinesGame).join(User, User.id == MinesGame.user_id)
+        .where(User.telegram_id == telegram_id, MinesGame.is_active == True)
+        .order_by(desc(MinesGame.id)).limit(1)
+    )
+
+
+def close_mines_games(outcome: str, *criteria):
+    """Закрывает активные игры по условию (сжигание, автосбор); RETURNING добавляет вызывающий."""
+    return (
+        update(MinesGame).where(MinesGame.is_active == True, *criteria)
+        .values(is_active=False, outcome=outcome, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def mines_move(game_id: int, expected_step: int, **values):
+    """Ход или сбор с оптимистичной проверкой step: 0 строк — игру уже изменили."""
+    return (
+        update(MinesGame)
+        .where(MinesGame.id == game_id, MinesGame.is_active == True, MinesGame.step == expected_step)
+        .values(updated_at=datetime.utcnow(), **values)
+    )
+
+
+def idle_mines_games(deadline: datetime, limit: int):
+    """(id игры, telegram_id игрока) — чистильщику нужен telegram_id для per-user lock."""
+    return (
+        select(MinesGame.id, User.telegram_id).join(User, User.id == MinesGame.user_id)
+        .where(MinesGame.is_active == True, MinesGame.updated_at < deadline)
+        .order_by(MinesGame.updated_at).limit(limit)
+    )
+
+
+# ═══════════════════════════════════════════════════════════════
+# СЧЕТЧИКИ user_stats (полный пересчет)
+# ═══════════════════════════════════════════════════════════════
+
+def inventory_totals(user_id: int):
+    return (
+        select(func.count(CaseOpening.id), func.coalesce(func.sum(Gift.value), 0))
+        .join(Gift, CaseOpening.gift_id == Gift.id)
+        .where(CaseOpening.user_id == user_id, CaseOpening.is_sold == False, CaseOpening.is_withdrawn == False)
+    )
+
+
+def openings_count(user_id: int):
+    return select(func.count(CaseOpening.id)).where(CaseOpening.user_id == user_id)
+
+
+def referrals_count(referrer_id: int):
+    return select(func.count(User.id)).where(User.referrer_id == referrer_id)
+
+
+def deposits_sum(user_id: int):
+    return select(func.coalesce(func.sum(Payment.amount), 0)).where(Payment.user_id == user_id, Payment.status == 'completed')
+
+
+def available_referral_earnings(referrer_id: int):
+    return (
+        select(func.coalesce(func.sum(ReferralEarning.amount), 0))
+        .where(ReferralEarning.referrer_id == referrer_id, ReferralEarning.is_withdrawn == False)
+    )
@@ -0,0 +1,70 @@
+"""
+Профиль SQLite для продакшена: бот, админ-бот и сервер пишут в один файл базы.
+
+На каждое новое соединение пула выполняются PRAGMA:
+  • journal_mode=WAL — читатели не блокируются писателем и наоборот (пишет по-прежнему один);
+  • synchronous=NORMAL — в WAL fsync только на чекпоинте: коммит не теряет целостность,
+    при отключении питания могут пропасть лишь последние транзакции;
+  • busy_timeout — второй писатель ждет блокировку, а не падает с «database is locked»;
+  • mmap_size, cache_size, temp_store=MEMORY — чтение через mmap, кэш страниц и
+    временные B-деревья (ORDER BY, GROUP BY) в памяти.
+Фоновая задача sqlite_maintenance_loop периодически делает wal_checkpoint(PASSIVE), чтобы
+WAL-файл не разрастался при постоянных читателях, и PRAGMA optimize (обновляет статистику
+планировщика по мере надобности).
+
+Переменные окружения:
+    SQLITE_TUNING=0                   — не применять профиль (по умолчанию включен)
+    SQLITE_BUSY_TIMEOUT_MS=5000
+    SQLITE_MMAP_SIZE=268435456        — байт
+    SQLITE_CACHE_SIZE_KB=16384        — на соединение
+    SQLITE_MAINTENANCE_INTERVAL=300   — секунд, 0 — без фоновой задачи
+"""
+import asyncio
+import os
+
+from sqlalchemy import event, text
+
+
+def tuning_enabled() -> bool:
+    return os.getenv("SQLITE_TUNING", "1").lower() not in ("0", "false", "no", "off")
+
+
+def sqlite_pragmas() -> dict[str, str | int]:
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384")),  # отрицательное — в КиБ
+        "temp_store": "MEMORY",
+    }
+
+
+def apply_sqlite_profile(engine):
+    """Вешает PRAGMA на событие connect движка (для не-SQLite баз ничего не делает)."""
+    if engine.dialect.name != "sqlite": return
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+async def sqlite_maintenance(engine):
+    async with engine.connect() as conn:
+        await conn.execute(text("PRAGMA wal_checkpoint(PASSIVE)"))
+        await conn.execute(text("PRAGMA optimize"))
+
+
+async def sqlite_maintenance_loop(engine, interval: float | None = None):
+    if interval is None: interval = float(os.getenv("SQLITE_MAINTENANCE_INTERVAL", "300"))
+    if engine.dialect.name != "sqlite" or interval <= 0: return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sqlite_maintenance(engine)
+        except Exception as e:
+            print(f"[SQLITE] Ошибка обслуживания: {e}")
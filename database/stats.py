@@ -0,0 +1,68 @@
+"""
+Счетчики user_stats: чтение за O(1) вместо пересчета по инвентарю, открытиям,
+рефералам и платежам игрока.
+
+Каждый обработчик, меняющий эти данные, вызывает bump_user_stats() в своей же
+транзакции — счетчики коммитятся или откатываются вместе с данными. Если строки
+для игрока еще нет (старый аккаунт), она один раз пересчитывается из исходных таблиц.
+"""
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from database import queries
+from database.models import UserStats
+
+
+async def recount_user_stats(session, user_id: int) -> UserStats:
+    """Полный пересчет счетчиков из исходных таблиц (с учетом еще не закоммиченных изменений сессии)."""
+    inventory_count, inventory_value = (await session.execute(queries.inventory_totals(user_id))).one()
+    total_openings = await session.scalar(queries.openings_count(user_id))
+    total_referrals = await session.scalar(queries.referrals_count(user_id))
+    total_deposits = await session.scalar(queries.deposits_sum(user_id))
+    referral_earnings = await session.scalar(queries.available_referral_earnings(user_id))
+    return UserStats(
+        user_id=user_id, inventory_count=inventory_count, inventory_value=int(inventory_value),
+        total_openings=total_openings, total_referrals=total_referrals,
+        total_deposits=int(total_deposits), referral_earnings_available=int(referral_earnings)
+    )
+
+
+async def bump_user_stats(session, user_id: int, **deltas: int):
+    """
+    Атомарно сдвигает счетчики: bump_user_stats(session, user.id, inventory_count=1, inventory_value=500).
+    Вызывать один раз на транзакцию, ПОСЛЕ всех изменений инвентаря: при отсутствии строки
+    пересчет уже видит эти изменения, и дельта повторно не применяется.
+    """
+    values = {name: getattr(UserStats, name) + delta for name, delta in deltas.items() if delta}
+    if not values:
+        return
+    stmt = update(UserStats).where(UserStats.user_id == user_id).values(**values).execution_options(synchronize_session=False)
+    if (await session.execute(stmt)).rowcount:
+        return
+    stats = await recount_user_stats(session, user_id)
+    try:
+        async with session.begin_nested():
+            session.add(stats)
+    except IntegrityError:
+        # Строку успел создать другой процесс (бот/сервер) пересчетом без наших изменений —
+        # savepoint откатан, транзакция вызывающего цела, применяем дельту к его строке
+        await session.execute(stmt)
+
+
+async def get_user_stats(session, user_id: int) -> UserStats:
+    """
+    Строка счетчиков игрока; при первом обращении создается пересчетом в savepoint.
+    Транзакцию вызывающего не коммитит и не откатывает: строка сохранится его коммитом,
+    а без коммита следующий запрос просто пересчитает ее заново.
+    """
+    stats = await session.get(UserStats, user_id)
+    if stats is not None:
+        return stats
+    stats = await recount_user_stats(session, user_id)
+    try:
+        async with session.begin_nested():
+            session.add(stats)
+    except IntegrityError:
+        # Параллельный запрос успел создать строку первым — savepoint откатан, берем его строку
+        stats = await session.get(UserStats, user_id)
+    return stats
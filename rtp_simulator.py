@@ -0,0 +1,231 @@
+"""
+Проверка математики игр: RTP, дисперсия и максимальный проигрыш заведения для каждой
+записи таблиц server.py (MINES_COEFS, PLINKO_MULTIPLIERS, кости, краш).
+
+Точные значения считаются аналитически:
+  • плинко — биномиальное распределение корзин C(n, k) / 2^n;
+  • мины — гипергеометрическая вероятность пройти k ячеек, умноженная на (1 - шанс скама)
+    на каждом шаге (MINES_BASE_SCAM_CHANCE + step * MINES_STEP_SCAM_CHANCE), стратегия
+    «открыть k ячеек и забрать»; ограничение банком не учитывается;
+  • кости — равномерный бросок 0..999999, выигрывают ровно chance * 10000 исходов;
+  • краш — P(X ≥ m) = (1 - CRASH_INSTANT_CHANCE) · CRASH_EDGE / (m - 0.005) (с учетом округления до сотых).
+Монте-Карло (numpy, векторно пачками) независимо перепроверяет мины (на реальных раскладах
+поля) и краш (по формуле generate_crash). Без numpy выводится только аналитика.
+
+Все величины — на единицу ставки. max_loss — максимальный проигрыш заведения за раунд (множитель - 1).
+
+    python rtp_simulator.py                   # все конфигурации
+    python rtp_simulator.py --game mines      # только одна игра
+    python rtp_simulator.py --bet 10          # с учетом округления выплаты вниз (floor) при ставке 10
+    python rtp_simulator.py --check           # код выхода 1, если RTP ≥ 100% или MC расходится с аналитикой
+"""
+import argparse
+import math
+import sys
+from dataclasses import dataclass
+
+try:
+    import numpy as np
+except ImportError:  # numpy нужен только для Монте-Карло
+    np = None
+
+from server import (
+    MINES_COEFS, PLINKO_MULTIPLIERS, MINES_BASE_SCAM_CHANCE, MINES_STEP_SCAM_CHANCE,
+    CRASH_INSTANT_CHANCE, CRASH_EDGE, DICE_PAYOUT
+)
+
+CRASH_TARGETS = [1.01, 1.1, 1.25, 1.5, 2.0, 3.0, 5.0, 10.0, 25.0, 100.0, 1000.0]
+RTP_LIMIT = 1.0          # --check: RTP не должен достигать 100%
+MC_SIGMA = 5.0           # --check: допустимое расхождение MC с аналитикой, в стандартных ошибках
+MC_MIN_HITS = 30         # --check: меньше ожидаемых выигрышей — нормальное приближение неверно, MC не сравнивается
+MC_BATCH = 200_000       # раундов в одной векторной пачке
+
+
+@dataclass
+class Result:
+    game: str
+    config: str
+    rtp: float
+    variance: float
+    max_loss: float
+    win_chance: float = 1.0  # вероятность ненулевой выплаты
+    mc_rtp: float | None = None
+    mc_rounds: int = 0
+
+
+def payout(multiplier: float, bet: int | None) -> float:
+    """Выплата на единицу ставки; с bet — как в server.py: floor(bet * multiplier)."""
+    return multiplier if bet is None else math.floor(bet * multiplier) / bet
+
+
+def _moments(outcomes: list[tuple[float, float]]) -> tuple[float, float]:
+    """(вероятность, выплата) → (матожидание, дисперсия)."""
+    mean = sum(p * x for p, x in outcomes)
+    return mean, sum(p * x * x for p, x in outcomes) - mean * mean
+
+
+# ─── Аналитика ────────────────────────────────────────────────────────────────
+
+def plinko_results(bet=None) -> list[Result]:
+    results = []
+    for difficulty, table in PLINKO_MULTIPLIERS.items():
+        for pins, multipliers in table.items():
+            outcomes = [(math.comb(pins, k) / 2 ** pins, payout(m, bet)) for k, m in enumerate(multipliers)]
+            rtp, var = _moments(outcomes)
+            results.append(Result('plinko', f'{difficulty} pins={pins}', rtp, var, max(multipliers) - 1))
+    return results
+
+
+def mines_scam_chance(step: int) -> float:
+    return min(1.0, MINES_BASE_SCAM_CHANCE + step * MINES_STEP_SCAM_CHANCE)
+
+
+def mines_survival(bombs: int, clicks: int) -> float:
+    """Вероятность открыть clicks безопасных ячеек подряд (поле 25 клеток) с учетом скама."""
+    p = 1.0
+    for s in range(clicks):
+        p *= (25 - bombs - s) / (25 - s) * (1 - mines_scam_chance(s))
+    return p
+
+
+def mines_results(bet=None) -> list[Result]:
+    results = []
+    for bombs, coefs in MINES_COEFS.items():
+        for clicks in range(1, min(len(coefs), 25 - bombs) + 1):
+            p = mines_survival(bombs, clicks)
+            m = coefs[clicks - 1]
+            rtp, var = _moments([(p, payout(m, bet)), (1 - p, 0.0)])
+            results.append(Result('mines', f'bombs={bombs} clicks={clicks}', rtp, var, m - 1, p))
+    return results
+
+
+def dice_results(bet=None) -> list[Result]:
+    # 'under' и 'over' симметричны: у обоих chance * 10000 выигрышных исходов из 10^6
+    results = []
+    for chance in range(1, 96):
+        p = chance * 10000 / 1_000_000
+        m = DICE_PAYOUT / chance
+        rtp, var = _moments([(p, payout(m, bet)), (1 - p, 0.0)])
+        results.append(Result('dice', f'chance={chance}%', rtp, var, m - 1, p))
+    return results
+
+
+def crash_win_probability(target: float) -> float:
+    return (1 - CRASH_INSTANT_CHANCE) * min(1.0, CRASH_EDGE / (target - 0.005))
+
+
+def crash_results(bet=None) -> list[Result]:
+    results = []
+    for target in CRASH_TARGETS:
+        p = crash_win_probability(target)
+        rtp, var = _moments([(p, payout(target, bet)), (1 - p, 0.0)])
+        results.append(Result('crash', f'cashout={target}x', rtp, var, target - 1, p))
+    return results
+
+
+# ─── Монте-Карло ──────────────────────────────────────────────────────────────
+
+def _batches(rounds: int):
+    while rounds > 0:
+        yield min(MC_BATCH, rounds)
+        rounds -= MC_BATCH
+
+
+def mines_monte_carlo(results: list[Result], rounds: int, bet=None, seed: int = 0):
+    """Реальные расклады поля (случайная перестановка 25 клеток), игрок открывает клетки 0..k-1."""
+    rng = np.random.default_rng(seed)
+    by_bombs: dict[int, list[Result]] = {}
+    for r in results:
+        by_bombs.setdefault(int(r.config.split()[0].split('=')[1]), []).append(r)
+    for bombs, rows in by_bombs.items():
+        max_clicks = len(rows)
+        coefs = np.array([payout(m, bet) for m in MINES_COEFS[bombs][:max_clicks]])
+        scam = np.array([mines_scam_chance(s) for s in range(max_clicks)])
+        total = np.zeros(max_clicks)
+        for n in _batches(rounds):
+            mines = np.zeros((n, 25), dtype=bool)
+            np.put_along_axis(mines, rng.random((n, 25)).argsort(axis=1)[:, :bombs], True, axis=1)
+            survived = np.cumprod(~mines[:, :max_clicks] & (rng.random((n, max_clicks)) >= scam), axis=1)
+            total += (survived * coefs).sum(axis=0)
+        mean = total / rounds
+        for i, r in enumerate(rows):
+            r.mc_rtp, r.mc_rounds = float(mean[i]), rounds
+
+
+def crash_monte_carlo(results: list[Result], rounds: int, bet=None, seed: int = 0):
+    """Та же формула, что CrashEngine.generate_crash, но векторно."""
+    rng = np.random.default_rng(seed)
+    targets = np.array(CRASH_TARGETS)
+    pays = np.array([payout(t, bet) for t in CRASH_TARGETS])
+    total = np.zeros(len(targets))
+    for n in _batches(rounds):
+        crash = np.round(np.maximum(1.0, CRASH_EDGE / (1.0 - rng.random(n))), 2)
+        crash[rng.random(n) < CRASH_INSTANT_CHANCE] = 1.0
+        win = (crash[:, None] >= targets[None, :]) * pays
+        total += win.sum(axis=0)
+    for i, r in enumerate(results):
+        r.mc_rtp, r.mc_rounds = float(total[i] / rounds), rounds
+
+
+# ─── CLI ──────────────────────────────────────────────────────────────────────
+
+GAMES = {'plinko': plinko_results, 'mines': mines_results, 'dice': dice_results, 'crash': crash_results}
+
+
+def simulate(games=None, rounds: int = 200_000, bet=None) -> list[Result]:
+    results = []
+    for game in games or GAMES:
+        rows = GAMES[game](bet)
+        if np is not None and rounds > 0:
+            if game == 'mines': mines_monte_carlo(rows, rounds, bet)
+            elif game == 'crash': crash_monte_carlo(rows, rounds, bet)
+        results.extend(rows)
+    return results
+
+
+def find_problems(results: list[Result]) -> list[str]:
+    problems = []
+    for r in results:
+        if r.rtp >= RTP_LIMIT:
+            problems.append(f'{r.game} {r.config}: RTP {r.rtp:.2%} ≥ {RTP_LIMIT:.0%}')
+        # Стандартная ошибка — из аналитической дисперсии (выборочная у редких выигрышей часто
+        # нулевая). Это нормальное приближение биномиального числа выигрышей: при единицах
+        # ожидаемых попаданий один выигрыш ×297160 делает среднее любым, такие записи пропускаем
+        if r.mc_rtp is None or r.win_chance * r.mc_rounds < MC_MIN_HITS: continue
+        if abs(r.mc_rtp - r.rtp) > MC_SIGMA * math.sqrt(r.variance / r.mc_rounds) + 1e-3:
+            problems.append(f'{r.game} {r.config}: MC {r.mc_rtp:.4f} ≠ аналитика {r.rtp:.4f}')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='RTP / дисперсия / макс. проигрыш для игровых таблиц')
+    parser.add_argument('--game', choices=list(GAMES), action='append')
+    parser.add_argument('--mc', type=int, default=200_000, help='раундов Монте-Карло на конфигурацию (0 — без MC)')
+    parser.add_argument('--bet', type=int, help='учитывать округление выплаты вниз при этой ставке')
+    parser.add_argument('--check', action='store_true', help='код выхода 1 при RTP ≥ 100%% или расхождении MC')
+    args = parser.parse_args()
+
+    if np is None and args.mc:
+        print('⚠️ numpy не установлен — Монте-Карло пропущен, только аналитика', file=sys.stderr)
+    results = simulate(args.game, args.mc, args.bet)
+
+    print(f"{'игра':<7} {'конфигурация':<22} {'RTP':>8} {'дисперсия':>14} {'макс. проигрыш':>15} {'MC RTP':>8}")
+    for r in results:
+        mc = f'{r.mc_rtp:8.2%}' if r.mc_rtp is not None else f"{'—':>8}"
+        if r.mc_rtp is not None and r.win_chance * r.mc_rounds < MC_MIN_HITS: mc += ' (мало выигрышей)'
+        print(f'{r.game:<7} {r.config:<22} {r.rtp:8.2%} {r.variance:14.2f} {r.max_loss:14.2f}x {mc}')
+
+    print()
+    for game in dict.fromkeys(r.game for r in results):
+        rtps = [r.rtp for r in results if r.game == game]
+        print(f'{game}: RTP от {min(rtps):.2%} до {max(rtps):.2%} ({len(rtps)} конфигураций)')
+
+    if args.check:
+        problems = find_problems(results)
+        for p in problems: print(f'❌ {p}', file=sys.stderr)
+        if problems: sys.exit(1)
+        print('✅ Все таблицы в норме')
+
+
+if __name__ == '__main__':
+    main()
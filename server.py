@@ -1,4 +1,3 @@
-import aiohttp
 from aiohttp import web
 from aiohttp.web import middleware
 import aiohttp_cors
@@ -9,14 +8,14 @@ import hmac
 import time
 import urllib.parse
 from datetime import datetime, timedelta
-from sqlalchemy import select, desc
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, insert, update, func
 from dotenv import load_dotenv
 import random
 import json
 import math
-
-MINES_BANK = 10000
+import bisect
+from collections import deque
+from dataclasses import dataclass
 
 # Мьютексы для защиты от race condition на критических операциях
 # ключ: telegram_id → asyncio.Lock()
@@ -90,10 +89,27 @@ PLINKO_MULTIPLIERS = {
     }
 }
 
+# Мины: шанс принудительного проигрыша на безопасной ячейке = BASE + step * STEP
+MINES_BASE_SCAM_CHANCE = 0.03
+MINES_STEP_SCAM_CHANCE = 0.01
+# Краш: доля мгновенных крашей на 1.00x и множитель распределения 0.99 / (1 - U)
+CRASH_INSTANT_CHANCE = 0.10
+CRASH_EDGE = 0.99
+# Кости: выплата = DICE_PAYOUT / шанс (%)
+DICE_PAYOUT = 99.0
+# Проверка всех таблиц: python rtp_simulator.py
+
 from database.models import (
-    async_session, User, Case, CaseOpening,
+    engine, async_session, User, Case, CaseOpening,
     Gift, CaseItem, Withdrawal, init_db, ReferralEarning, Payment, MinesGame, CrashBet, DiceGame, PromoCode, PromoCodeUsage, PlinkoGame, UpgradeGame
 )
+from database import queries
+from database.stats import bump_user_stats, get_user_stats
+from database.promo import get_promo, claim_promo
+from database.bank import init_banks, bank_balance, adjust_bank, apply_bank_delta, reconcile_banks_loop
+from database.sqlite_profile import sqlite_maintenance_loop
+from telegram_api import TelegramAPI, TelegramAPIError
+from telegram_dispatch import OutboundDispatcher, PRIORITY_HIGH
 
 load_dotenv()
 
@@ -212,6 +228,30 @@ def safe_positive_int(value, default=0) -> int:
         return default
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# KEYSET PAGINATION
+# Курсор = (created_at, id) последней отданной строки. Следующая страница берется
+# через WHERE (created_at, id) < cursor по индексу — без OFFSET и без сортировки
+# всей выборки, поэтому время страницы не зависит от объема данных.
+# ═══════════════════════════════════════════════════════════════════════════════
+
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return f'{created_at.isoformat()}_{row_id}'
+
+def decode_cursor(raw: str | None) -> tuple[datetime, int] | None:
+    """Разбирает курсор вида '<iso created_at>_<id>'. ValueError если курсор битый."""
+    if not raw:
+        return None
+    created_at, _, row_id = raw.rpartition('_')
+    return datetime.fromisoformat(created_at), int(row_id)
+
+def page_size(request) -> int:
+    return min(safe_positive_int(request.query.get('limit'), PAGE_SIZE_DEFAULT), PAGE_SIZE_MAX)
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # USER INIT
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -246,7 +286,7 @@ async def init_user(request):
         return web.json_response({'success': False, 'error': 'telegram_id required'})
 
     async with async_session() as session:
-        result = await session.execute(select(User).where(User.telegram_id == telegram_id))
+        result = await session.execute(queries.user_by_telegram_id(telegram_id))
         user = result.scalar_one_or_none()
 
         if not user:
@@ -258,10 +298,12 @@ async def init_user(request):
             )
             referrer_code = data.get('referrer_code')
             if referrer_code:
-                referrer = (await session.execute(select(User).where(User.referral_code == referrer_code))).scalar_one_or_none()
+                referrer = (await session.execute(queries.user_by_referral_code(referrer_code))).scalar_one_or_none()
                 if referrer and referrer.telegram_id != telegram_id:
                     user.referrer_id = referrer.id
             session.add(user)
+            if user.referrer_id:
+                await bump_user_stats(session, user.referrer_id, total_referrals=1)
             await session.commit()
             await session.refresh(user)
         else:
@@ -299,15 +341,15 @@ class CrashEngine:
         self.start_time = 0
 
     def generate_crash(self):
-        if random.random() < 0.10:
+        if random.random() < CRASH_INSTANT_CHANCE:
             return 1.00
-        return round(max(1.00, 0.99 / (1.0 - random.random())), 2)
+        return round(max(1.00, CRASH_EDGE / (1.0 - random.random())), 2)
 
     async def _process_auto_cashout_db(self, user_id, db_bet_id, win_amount, target_mul):
         try:
             async with get_user_lock(user_id):
                 async with async_session() as session:
-                    user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+                    user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
                     bet_record = await session.get(CrashBet, db_bet_id)
                     if user and bet_record and bet_record.cashout_multiplier is None:
                         user.balance += win_amount
@@ -403,7 +445,7 @@ async def crash_bet(request):
 
     async with get_user_lock(user_id):
         async with async_session() as session:
-            user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
             if not user or user.balance < bet:
                 return web.json_response({'success': False, 'error': 'Недостаточно звезд'})
             user.balance -= bet
@@ -444,7 +486,7 @@ async def crash_cashout(request):
 
     async with get_user_lock(user_id):
         async with async_session() as session:
-            user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
             bet_record = await session.get(CrashBet, player['db_bet_id'])
             if bet_record and bet_record.cashout_multiplier is None:
                 bet_record.cashout_multiplier = current_mul
@@ -454,13 +496,151 @@ async def crash_cashout(request):
             return web.json_response({'success': True, 'balance': user.balance, 'win_amount': win_amount, 'multiplier': current_mul})
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# LIVE DROPS
+# Лента последних дропов живет в памяти: open_case и upgrade_bet докладывают
+# выигрыш сразу после коммита, /api/history/recent отдает буфер без запросов к БД.
+# При старте буфер прогревается одним join-запросом. Дропы из бота и других воркеров
+# сервера подтягиваются опросом case_openings по id > последнего увиденного (keyset по PK).
+# Подписчики /api/history/ws получают снимок при подключении и дальше только
+# новые дропы; кадр кодируется в JSON один раз на событие, а не на клиента.
+# ═══════════════════════════════════════════════════════════════════════════════
+
+LIVE_FEED_SIZE = 50
+LIVE_FEED_QUEUE = 20  # сколько неотправленных кадров держим на медленного клиента
+LIVE_FEED_POLL_INTERVAL = 2  # секунд между опросами case_openings
+
+_RESYNC = object()  # маркер в очереди клиента: отправить свежий снимок вместо пропущенных событий
+
+class LiveDropFeed:
+    def __init__(self, size: int = LIVE_FEED_SIZE):
+        self.size = size
+        self.drops = deque(maxlen=size)  # новые слева
+        self.warmed = False
+        self._warm_lock = asyncio.Lock()
+        self.subscribers: set[asyncio.Queue] = set()
+        self._snapshot_frame = None
+        self._last_polled_id = 0                          # курсор опроса БД
+        self._drop_ids: set[int] = set()                  # id в self.drops: push и опрос не дублируют друг друга
+
+    @staticmethod
+    def serialize(opening, user, gift) -> dict:
+        return {
+            'id': opening.id, 'created_at': opening.created_at.isoformat(),
+            'user': {'first_name': user.first_name or 'Пользователь', 'username': user.username},
+            'gift': {'id': gift.id, 'name': gift.name, 'rarity': gift.rarity, 'value': gift.value,
+                     'image_url': gift.image_url,
+                     'gift_number': gift.gift_number if gift.gift_number else ((gift.id - 1) % 120 + 1)}
+        }
+
+    def push(self, opening, user, gift):
+        self._publish(self.serialize(opening, user, gift))
+
+    def _publish(self, drop: dict) -> bool:
+        """Добавляет дроп в ленту и рассылает подписчикам; False, если он уже там."""
+        # Опрос может прочитать закоммиченный дроп раньше, чем обработчик вызовет push
+        if drop['id'] in self._drop_ids: return False
+        if len(self.drops) == self.drops.maxlen: self._drop_ids.discard(self.drops[-1]['id'])
+        self.drops.appendleft(drop)
+        self._drop_ids.add(drop['id'])
+        self._snapshot_frame = None
+        if not self.subscribers: return True
+        frame = json.dumps({'type': 'drop', 'drop': drop})
+        for queue in self.subscribers:
+            if queue.full():
+                # Клиент не успевает: схлопываем хвост событий в один снимок
+                while not queue.empty(): queue.get_nowait()
+                queue.put_nowait(_RESYNC)
+            else:
+                queue.put_nowait(frame)
+        return True
+
+    def snapshot_frame(self) -> str:
+        if self._snapshot_frame is None:
+            self._snapshot_frame = json.dumps({'type': 'snapshot', 'drops': self.snapshot()})
+        return self._snapshot_frame
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=LIVE_FEED_QUEUE)
+        queue.put_nowait(_RESYNC)  # первым кадром клиент получает текущую ленту
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    async def pump(self, ws, queue: asyncio.Queue):
+        """Отправляет кадры из очереди клиента в его сокет, пока тот жив."""
+        try:
+            while not ws.closed:
+                frame = await queue.get()
+                if frame is _RESYNC:
+                    # Все, что накопилось до этого момента, уже есть в снимке
+                    while not queue.empty(): queue.get_nowait()
+                    frame = self.snapshot_frame()
+                await ws.send_str(frame)
+        except (ConnectionResetError, RuntimeError):
+            pass
+
+    async def warm(self):
+        async with self._warm_lock:
+            if self.warmed: return
+            async with async_session() as session:
+                rows = (await session.execute(queries.recent_drops(self.size))).all()
+                last_id = await session.scalar(select(func.max(CaseOpening.id)))
+            self.drops.clear()
+            self.drops.extend(self.serialize(o, u, g) for o, u, g in rows)
+            self._drop_ids = {drop['id'] for drop in self.drops}
+            self._last_polled_id = max(self._last_polled_id, last_id or 0)
+            self.warmed = True
+
+    async def poll(self) -> int:
+        """Подтягивает дропы, записанные другими процессами; возвращает число новых."""
+        if not self.warmed: await self.warm()
+        async with async_session() as session:
+            rows = (await session.execute(queries.drops_after(self._last_polled_id, self.size))).all()
+        added = 0
+        for opening, user, gift in rows:
+            self._last_polled_id = opening.id
+            added += self._publish(self.serialize(opening, user, gift))
+        return added
+
+    async def poll_loop(self, interval: float = LIVE_FEED_POLL_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f'[FEED] Ошибка опроса дропов: {e}')
+
+    def snapshot(self) -> list[dict]:
+        return list(self.drops)
+
+live_feed = LiveDropFeed()
+
+
+async def history_ws(request):
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    if not live_feed.warmed:
+        await live_feed.warm()
+    queue = live_feed.subscribe()
+    sender = asyncio.create_task(live_feed.pump(ws, queue))
+    try:
+        async for msg in ws: pass
+    finally:
+        live_feed.unsubscribe(queue)
+        sender.cancel()
+    return ws
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # CASES
 # ═══════════════════════════════════════════════════════════════════════════════
 
 async def list_cases(request):
     async with async_session() as session:
-        cases = (await session.execute(select(Case).where(Case.is_active == True))).scalars().all()
+        cases = (await session.execute(queries.active_cases())).scalars().all()
         cases_data = []
         for case in cases:
             local_img = f'dist/assets/images/cases/case_{case.id}.png'
@@ -475,7 +655,7 @@ async def get_case_items(request):
     async with async_session() as session:
         case = await session.get(Case, case_id)
         if not case: return web.json_response({'success': False, 'error': 'Case not found'})
-        items = (await session.execute(select(CaseItem).where(CaseItem.case_id == case_id).options(joinedload(CaseItem.gift)))).scalars().unique().all()
+        items = (await session.execute(queries.case_items(case_id))).scalars().unique().all()
         items_data = []
         for item in items:
             g = item.gift
@@ -500,7 +680,7 @@ async def open_case(request):
         case_id = int(case_id)
         async with get_user_lock(user_id):
             async with async_session() as session:
-                user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+                user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
                 if not user: return web.json_response({'success': False, 'error': 'User not found'})
 
                 case = await session.get(Case, case_id)
@@ -523,7 +703,7 @@ async def open_case(request):
                         return web.json_response({'success': False, 'error': 'Insufficient balance'})
                     user.balance -= case.price
 
-                items = (await session.execute(select(CaseItem).where(CaseItem.case_id == case_id).options(joinedload(CaseItem.gift)))).scalars().unique().all()
+                items = (await session.execute(queries.case_items(case_id))).scalars().unique().all()
                 if not items: return web.json_response({'success': False, 'error': 'No items in case'})
 
                 total_chance = sum((float(i.drop_chance) if i.drop_chance else 0.0) for i in items)
@@ -546,6 +726,10 @@ async def open_case(request):
                 opening = CaseOpening(user_id=user.id, case_id=case_id, gift_id=gift.id)
                 if is_stars: opening.is_sold = True
                 session.add(opening)
+                if is_stars:
+                    await bump_user_stats(session, user.id, total_openings=1)
+                else:
+                    await bump_user_stats(session, user.id, total_openings=1, inventory_count=1, inventory_value=gift.value or 0)
 
                 if case.is_free:
                     from datetime import timezone
@@ -553,6 +737,7 @@ async def open_case(request):
 
                 await session.commit()
                 await session.refresh(opening)
+                live_feed.push(opening, user, gift)
 
                 return web.json_response({
                     'success': True, 'opening_id': opening.id,
@@ -570,11 +755,10 @@ async def open_case(request):
 # INVENTORY / WITHDRAW / SELL
 # ═══════════════════════════════════════════════════════════════════════════════
 
-async def notify_admins_about_withdrawal(withdrawal_id, user_id, username, gift_name, price):
-    bot_token = os.getenv('BOT_TOKEN')
+def notify_admins_about_withdrawal(app, withdrawal_id, user_id, username, gift_name, price):
+    tg_api, outbound = app[TG_API], app[OUTBOUND]
     admin_ids = [int(x) for x in os.getenv('ADMIN_IDS', '').split(',') if x]
-    if not bot_token or not admin_ids: return
-    url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
+    if not tg_api.token or not admin_ids: return
     kb = {'inline_keyboard': [[
         {'text': '✅ Подтвердить', 'callback_data': f'wd_appr_{withdrawal_id}'},
         {'text': '❌ Отклонить',   'callback_data': f'wd_rej_{withdrawal_id}'}
@@ -584,10 +768,9 @@ async def notify_admins_about_withdrawal(withdrawal_id, user_id, username, gift_
             f'💰 Ценность: {price} ⭐\n'
             f'👤 Игрок: <a href="tg://user?id={user_id}">{username or "Без имени"}</a>\n'
             f'🆔 Заявка: #{withdrawal_id}')
-    async with aiohttp.ClientSession() as s:
-        for ad_id in admin_ids:
-            try: await s.post(url, json={'chat_id': ad_id, 'text': text, 'parse_mode': 'HTML', 'reply_markup': kb})
-            except: pass
+    for ad_id in admin_ids:
+        outbound.submit(lambda ad_id=ad_id: tg_api.send_message(ad_id, text, parse_mode='HTML', reply_markup=kb),
+                        chat_id=ad_id, priority=PRIORITY_HIGH)
 
 
 async def get_inventory(request):
@@ -598,38 +781,37 @@ async def get_inventory(request):
     if path_id != user_id:
         return web.json_response({'success': False, 'error': 'Forbidden'}, status=403)
 
+    limit = page_size(request)
+    try:
+        cursor = decode_cursor(request.query.get('cursor'))
+    except ValueError:
+        return web.json_response({'success': False, 'error': 'Invalid cursor'}, status=400)
+
     try:
         async with async_session() as session:
-            user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
             if not user: return web.json_response({'success': False, 'error': 'User not found'})
 
-            openings = (await session.execute(
-                select(CaseOpening)
-                .where(CaseOpening.user_id == user.id, CaseOpening.is_sold == False, CaseOpening.is_withdrawn == False)
-                .order_by(desc(CaseOpening.created_at)).options(joinedload(CaseOpening.gift))
-            )).scalars().unique().all()
-
-            opening_ids = [o.id for o in openings]
-            withdrawals = (await session.execute(
-                select(Withdrawal).where(Withdrawal.opening_id.in_(opening_ids)).order_by(desc(Withdrawal.created_at))
-            )).scalars().all()
+            # Одна keyset-страница (limit + 1 строк — признак следующей) вместе со статусом последней заявки на вывод
+            rows = (await session.execute(queries.inventory_page(user.id, limit, cursor))).unique().all()
 
-            wd_map = {}
-            for w in withdrawals:
-                if w.opening_id not in wd_map: wd_map[w.opening_id] = w.status
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1][0].created_at, rows[-1][0].id)
 
             items_data = []
-            for opening in openings:
+            for opening, status in rows:
                 g = opening.gift
                 items_data.append({
-                    'opening_id': opening.id, 'status': wd_map.get(opening.id),
+                    'opening_id': opening.id, 'status': status,
                     'created_at': opening.created_at.isoformat(),
                     'gift': {'id': g.id, 'name': g.name, 'rarity': g.rarity, 'value': g.value,
                              'image_url': g.image_url,
                              'gift_number': g.gift_number if g.gift_number else ((g.id - 1) % 120 + 1),
                              'is_stars': bool(g.gift_number and g.gift_number >= 200)}
                 })
-            return web.json_response({'success': True, 'inventory': items_data})
+            return web.json_response({'success': True, 'inventory': items_data, 'next_cursor': next_cursor})
     except Exception:
         return web.json_response({'success': False, 'error': 'Internal server error'}, status=500)
 
@@ -642,16 +824,14 @@ async def withdraw_item(request):
     opening_id = data.get('opening_id')
 
     async with async_session() as session:
-        user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+        user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
         opening = await session.get(CaseOpening, opening_id)
         if not user or not opening or opening.user_id != user.id:
             return web.json_response({'success': False, 'error': 'Not found'})
         if opening.is_withdrawn:
             return web.json_response({'success': False, 'error': 'Уже выведено'})
 
-        existing = (await session.execute(
-            select(Withdrawal).where(Withdrawal.opening_id == opening.id, Withdrawal.status == 'pending')
-        )).scalar_one_or_none()
+        existing = (await session.execute(queries.pending_withdrawal(opening.id))).scalar_one_or_none()
         if existing: return web.json_response({'success': False, 'error': 'Заявка уже в обработке'})
 
         withdrawal = Withdrawal(user_id=user.id, opening_id=opening.id, status='pending')
@@ -660,9 +840,9 @@ async def withdraw_item(request):
         await session.refresh(withdrawal)
 
         gift = await session.get(Gift, opening.gift_id)
-        asyncio.create_task(notify_admins_about_withdrawal(
-            withdrawal.id, user.telegram_id, user.username, gift.name, gift.value
-        ))
+        notify_admins_about_withdrawal(
+            request.app, withdrawal.id, user.telegram_id, user.username, gift.name, gift.value
+        )
         return web.json_response({'success': True, 'message': 'Withdrawal request created'})
 
 
@@ -675,7 +855,7 @@ async def sell_item(request):
 
     async with get_user_lock(user_id):
         async with async_session() as session:
-            user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
             opening = await session.get(CaseOpening, opening_id)
             if not user or not opening or opening.user_id != user.id or opening.is_withdrawn or opening.is_sold:
                 return web.json_response({'success': False, 'error': 'Invalid request'})
@@ -688,33 +868,68 @@ async def sell_item(request):
             sell_value = gift.value or 0
             user.balance += sell_value
             opening.is_sold = True
+            await bump_user_stats(session, user.id, inventory_count=-1, inventory_value=-sell_value)
             await session.commit()
             return web.json_response({'success': True, 'earned': sell_value, 'new_balance': user.balance})
 
 
+BULK_SELL_MAX_IDS = 500
+
+async def sell_bulk(request):
+    """
+    Продажа пачки предметов (opening_ids) или всего инвентаря (all=true) одной транзакцией:
+    один агрегат SUM по join с gifts, один UPDATE и одно начисление на баланс.
+    """
+    user_id = get_verified_user_id(request)
+    if user_id is None: return auth_error()
+
+    data = await request.json()
+    sell_all = data.get('all') is True
+    opening_ids = set()
+    if not sell_all:
+        raw_ids = data.get('opening_ids')
+        if not isinstance(raw_ids, list) or not raw_ids or len(raw_ids) > BULK_SELL_MAX_IDS:
+            return web.json_response({'success': False, 'error': f'Передайте от 1 до {BULK_SELL_MAX_IDS} предметов или all=true'})
+        try:
+            opening_ids = {int(i) for i in raw_ids}
+        except (TypeError, ValueError):
+            return web.json_response({'success': False, 'error': 'Invalid request'})
+
+    async with get_user_lock(user_id):
+        async with async_session() as session:
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
+            if not user: return web.json_response({'success': False, 'error': 'User not found'})
+
+            # Продается только то, что лежит в инвентаре и не ждет вывода
+            sellable = queries.sellable_openings(user.id, None if sell_all else opening_ids)
+            count, total = (await session.execute(queries.sell_totals(sellable))).one()
+            if count == 0:
+                return web.json_response({'success': False, 'error': 'Нечего продавать'})
+            if not sell_all and count != len(opening_ids):
+                return web.json_response({'success': False, 'error': 'Один или несколько предметов уже проданы или недоступны'})
+
+            result = await session.execute(queries.mark_sold(sellable))
+            # Тот же предикат, что и у SUM: если кто-то успел изменить инвентарь — откатываемся
+            if result.rowcount != count:
+                await session.rollback()
+                return web.json_response({'success': False, 'error': 'Инвентарь изменился, попробуйте еще раз'})
+
+            user.balance += int(total)
+            await bump_user_stats(session, user.id, inventory_count=-count, inventory_value=-int(total))
+            await session.commit()
+            return web.json_response({'success': True, 'sold': count, 'earned': int(total), 'new_balance': user.balance})
+
+
 async def get_history(request):
-    async with async_session() as session:
-        openings = (await session.execute(
-            select(CaseOpening).order_by(desc(CaseOpening.created_at)).limit(50).options(joinedload(CaseOpening.gift))
-        )).scalars().unique().all()
-        history_data = []
-        for opening in openings:
-            user = (await session.execute(select(User).where(User.id == opening.user_id))).scalar_one()
-            g = opening.gift
-            history_data.append({
-                'id': opening.id, 'created_at': opening.created_at.isoformat(),
-                'user': {'first_name': user.first_name or 'Пользователь', 'username': user.username},
-                'gift': {'id': g.id, 'name': g.name, 'rarity': g.rarity, 'value': g.value,
-                         'image_url': g.image_url,
-                         'gift_number': g.gift_number if g.gift_number else ((g.id - 1) % 120 + 1)}
-            })
-        return web.json_response({'success': True, 'history': history_data})
+    if not live_feed.warmed:
+        await live_feed.warm()
+    return web.json_response({'success': True, 'history': live_feed.snapshot()})
 
 
 async def check_free_case(request):
     telegram_id = int(request.match_info['telegram_id'])
     async with async_session() as session:
-        user = (await session.execute(select(User).where(User.telegram_id == telegram_id))).scalar_one_or_none()
+        user = (await session.execute(queries.user_by_telegram_id(telegram_id))).scalar_one_or_none()
         if not user or not user.last_free_case: return web.json_response({'available': True})
         try:
             from datetime import timezone
@@ -743,22 +958,16 @@ async def get_profile(request):
 
     try:
         async with async_session() as session:
-            user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
             if not user: return web.json_response({'success': False, 'error': 'User not found'})
-            openings_count = len((await session.execute(select(CaseOpening).where(CaseOpening.user_id == user.id))).scalars().all())
-            total_referrals = len((await session.execute(select(User).where(User.referrer_id == user.id))).scalars().all())
-            deposits_result = await session.execute(select(Payment).where(Payment.user_id == user.id, Payment.status == 'completed'))
-            total_deposits = sum((p.amount or 0) for p in deposits_result.scalars().all())
-            referral_earnings_result = await session.execute(
-                select(ReferralEarning).where(ReferralEarning.referrer_id == user.id, ReferralEarning.is_withdrawn == False)
-            )
-            available_referral_earnings = sum((e.amount or 0) for e in referral_earnings_result.scalars().all())
+            stats = await get_user_stats(session, user.id)
             return web.json_response({'success': True, 'profile': {
                 'id': user.id, 'telegram_id': user.telegram_id,
                 'first_name': user.first_name, 'username': user.username, 'photo_url': user.photo_url,
                 'balance': user.balance, 'referral_code': user.referral_code,
-                'total_openings': openings_count, 'total_referrals': total_referrals,
-                'total_deposits': total_deposits, 'available_referral_earnings': available_referral_earnings
+                'total_openings': stats.total_openings, 'total_referrals': stats.total_referrals,
+                'total_deposits': stats.total_deposits, 'available_referral_earnings': stats.referral_earnings_available,
+                'inventory_count': stats.inventory_count, 'inventory_value': stats.inventory_value
             }})
     except Exception as e:
         return web.json_response({'success': False, 'error': str(e)}, status=500)
@@ -770,16 +979,17 @@ async def withdraw_referrals(request):
 
     async with get_user_lock(user_id):
         async with async_session() as session:
-            user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
             if not user: return web.json_response({'success': False, 'error': 'User not found'})
-            earnings = (await session.execute(
-                select(ReferralEarning).where(ReferralEarning.referrer_id == user.id, ReferralEarning.is_withdrawn == False)
-            )).scalars().all()
-            total_amount = sum((e.amount or 0) for e in earnings)
+            # Один UPDATE ... RETURNING: помечаем ровно те начисления, сумму которых зачисляем,
+            # даже если параллельно (из бота) прилетит новое
+            amounts = (await session.execute(queries.claim_referral_earnings(user.id))).scalars().all()
+            total_amount = sum((a or 0) for a in amounts)
             if total_amount == 0:
+                await session.rollback()
                 return web.json_response({'success': False, 'error': 'Нет доступных звезд для вывода'})
             user.balance += total_amount
-            for e in earnings: e.is_withdrawn = True
+            await bump_user_stats(session, user.id, referral_earnings_available=-total_amount)
             await session.commit()
             return web.json_response({'success': True, 'withdrawn': total_amount, 'new_balance': user.balance})
 
@@ -791,19 +1001,30 @@ async def get_referrals(request):
     if path_id != user_id:
         return web.json_response({'success': False, 'error': 'Forbidden'}, status=403)
 
+    limit = page_size(request)
+    try:
+        cursor = decode_cursor(request.query.get('cursor'))
+    except ValueError:
+        return web.json_response({'success': False, 'error': 'Invalid cursor'}, status=400)
+
     async with async_session() as session:
-        user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+        user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
         if not user: return web.json_response({'success': False, 'error': 'User not found'})
-        referrals = (await session.execute(select(User).where(User.referrer_id == user.id).order_by(desc(User.created_at)))).scalars().all()
-        referrals_data = []
-        for ref in referrals:
-            earnings = (await session.execute(select(ReferralEarning).where(ReferralEarning.referrer_id == user.id, ReferralEarning.referred_user_id == ref.id))).scalars().all()
-            referrals_data.append({
-                'id': ref.id, 'first_name': ref.first_name, 'username': ref.username, 'photo_url': ref.photo_url,
-                'joined_at': ref.created_at.isoformat() if ref.created_at else None,
-                'total_earned': sum((e.amount or 0) for e in earnings)
-            })
-        return web.json_response({'success': True, 'referrals': referrals_data})
+
+        # Одна выборка: страница рефералов вместе с их заработком
+        rows = (await session.execute(queries.referrals_page(user.id, limit, cursor))).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][0].created_at, rows[-1][0].id)
+
+        referrals_data = [{
+            'id': ref.id, 'first_name': ref.first_name, 'username': ref.username, 'photo_url': ref.photo_url,
+            'joined_at': ref.created_at.isoformat() if ref.created_at else None,
+            'total_earned': int(earned)
+        } for ref, earned in rows]
+        return web.json_response({'success': True, 'referrals': referrals_data, 'next_cursor': next_cursor})
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -827,16 +1048,17 @@ async def create_invoice(request):
     promo_id = None
 
     async with async_session() as session:
-        user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+        user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
         if not user: return web.json_response({'success': False, 'error': 'Юзер не найден'})
 
         if code:
-            promo = (await session.execute(select(PromoCode).where(PromoCode.code == code, PromoCode.is_active == True))).scalar_one_or_none()
+            promo = await get_promo(session, code)
             if not promo: return web.json_response({'success': False, 'error': 'Промокод не найден'})
             if promo.promo_type != 'deposit': return web.json_response({'success': False, 'error': 'Этот промокод не для депозита'})
-            if promo.uses_limit > 0 and promo.uses_count >= promo.uses_limit:
+            # Предварительные проверки; активация фиксируется атомарно при успешной оплате
+            if promo.uses_limit > 0 and await session.scalar(select(PromoCode.uses_count).where(PromoCode.id == promo.id)) >= promo.uses_limit:
                 return web.json_response({'success': False, 'error': 'Лимит активаций исчерпан'})
-            usage = (await session.execute(select(PromoCodeUsage).where(PromoCodeUsage.user_id == user.id, PromoCodeUsage.promo_id == promo.id))).scalar_one_or_none()
+            usage = await session.scalar(queries.promo_usage(user.id, promo.id))
             if usage: return web.json_response({'success': False, 'error': 'Вы уже использовали этот код'})
             bonus_amount = int(stars * (promo.value / 100.0))
             promo_id = promo.id
@@ -846,20 +1068,16 @@ async def create_invoice(request):
         await session.commit()
         await session.refresh(payment)
 
-        api_url = f'https://api.telegram.org/bot{bot_token}/createInvoiceLink'
-        invoice_payload = {
-            'title': f'{stars} Telegram Stars',
-            'description': f'Пополнение баланса на {stars} звезд',
-            'payload': f'pay_{payment.id}',
-            'provider_token': '', 'currency': 'XTR',
-            'prices': [{'label': f'{stars} Stars', 'amount': stars}]
-        }
         try:
-            async with aiohttp.ClientSession() as http_session:
-                async with http_session.post(api_url, json=invoice_payload) as resp:
-                    result = await resp.json()
-                    if result.get('ok'): return web.json_response({'success': True, 'invoice_link': result['result']})
-                    else: return web.json_response({'success': False, 'error': result.get('description', 'Ошибка API')})
+            invoice_link = await request.app[TG_API].create_invoice_link(
+                title=f'{stars} Telegram Stars',
+                description=f'Пополнение баланса на {stars} звезд',
+                payload=f'pay_{payment.id}', currency='XTR',
+                prices=[{'label': f'{stars} Stars', 'amount': stars}]
+            )
+            return web.json_response({'success': True, 'invoice_link': invoice_link})
+        except TelegramAPIError as e:
+            return web.json_response({'success': False, 'error': e.description})
         except Exception:
             return web.json_response({'success': False, 'error': 'Внутренняя ошибка сервера'})
 
@@ -872,31 +1090,53 @@ async def activate_promo(request):
     code = data.get('code', '').strip().upper()
     if not code: return web.json_response({'success': False, 'error': 'Введите промокод'})
 
-    async with async_session() as session:
-        user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
-        promo = (await session.execute(select(PromoCode).where(PromoCode.code == code, PromoCode.is_active == True))).scalar_one_or_none()
-        if not promo: return web.json_response({'success': False, 'error': 'Промокод не найден или неактивен'})
-        if promo.promo_type != 'balance': return web.json_response({'success': False, 'error': 'Этот промокод только для пополнения!'})
-        if promo.uses_limit > 0 and promo.uses_count >= promo.uses_limit:
-            return web.json_response({'success': False, 'error': 'Лимит активаций исчерпан'})
-        usage = (await session.execute(select(PromoCodeUsage).where(PromoCodeUsage.user_id == user.id, PromoCodeUsage.promo_id == promo.id))).scalar_one_or_none()
-        if usage: return web.json_response({'success': False, 'error': 'Вы уже активировали этот промокод'})
-
-        # Ограничение суммы промокода — защита от неправильно созданных кодов
-        if promo.value > 100000:
-            return web.json_response({'success': False, 'error': 'Промокод заблокирован'})
-
-        user.balance += promo.value
-        promo.uses_count += 1
-        session.add(PromoCodeUsage(user_id=user.id, promo_id=promo.id))
-        await session.commit()
-        return web.json_response({'success': True, 'message': f'Активировано! +{promo.value} ⭐', 'balance': user.balance})
+    async with get_user_lock(user_id):
+        async with async_session() as session:
+            promo = await get_promo(session, code)
+            if not promo: return web.json_response({'success': False, 'error': 'Промокод не найден или неактивен'})
+            if promo.promo_type != 'balance': return web.json_response({'success': False, 'error': 'Этот промокод только для пополнения!'})
+
+            # Ограничение суммы промокода — защита от неправильно созданных кодов
+            if promo.value > 100000:
+                return web.json_response({'success': False, 'error': 'Промокод заблокирован'})
+
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
+            if not user: return web.json_response({'success': False, 'error': 'Юзер не найден'})
+
+            # Уникальный индекс (user_id, promo_id) + условный UPDATE uses_count: без гонок и перерасхода лимита
+            error = await claim_promo(session, promo.id, user.id)
+            if error == 'used': return web.json_response({'success': False, 'error': 'Вы уже активировали этот промокод'})
+            if error == 'limit': return web.json_response({'success': False, 'error': 'Лимит активаций исчерпан'})
+
+            user.balance += promo.value
+            await session.commit()
+            return web.json_response({'success': True, 'message': f'Активировано! +{promo.value} ⭐', 'balance': user.balance})
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # DICE
 # ═══════════════════════════════════════════════════════════════════════════════
 
+DICE_AUTO_MAX_ROLLS = 1000
+
+
+def validate_dice_params(bet, chance, roll_type):
+    if bet < 1: return 'Минимальная ставка 1 ⭐'
+    if chance < 1 or chance > 95: return 'Шанс от 1% до 95%'
+    if roll_type not in ['under', 'over']: return 'Ошибка направления'
+    return None
+
+
+def roll_dice(bet: int, chance: int, roll_type: str) -> tuple[int, bool, int]:
+    """Один бросок: (число 0..999999, выигрыш ли, выплата)."""
+    rand_num = random.randint(0, 999999)
+    nwin_under = (chance * 10000) - 1
+    nwin_over = 1000000 - (chance * 10000)
+    is_win = (roll_type == 'under' and rand_num <= nwin_under) or (roll_type == 'over' and rand_num >= nwin_over)
+    win_amount = math.floor(bet * DICE_PAYOUT / chance) if is_win else 0
+    return rand_num, is_win, win_amount
+
+
 async def dice_play(request):
     user_id = get_verified_user_id(request)
     if user_id is None: return auth_error()
@@ -908,36 +1148,224 @@ async def dice_play(request):
     chance = int(data.get('chance', 80))
     roll_type = data.get('type', 'under')
 
-    if bet < 1: return web.json_response({'success': False, 'error': 'Минимальная ставка 1 ⭐'})
-    if chance < 1 or chance > 95: return web.json_response({'success': False, 'error': 'Шанс от 1% до 95%'})
-    if roll_type not in ['under', 'over']: return web.json_response({'success': False, 'error': 'Ошибка направления'})
+    error = validate_dice_params(bet, chance, roll_type)
+    if error: return web.json_response({'success': False, 'error': error})
 
     async with get_user_lock(user_id):
         async with async_session() as session:
-            user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
             if not user or user.balance < bet:
                 return web.json_response({'success': False, 'error': 'Недостаточно звезд'})
-            user.balance -= bet
 
-            rand_num = random.randint(0, 999999)
-            nwin_under = (chance * 10000) - 1
-            nwin_over = 1000000 - (chance * 10000)
-            is_win = (roll_type == 'under' and rand_num <= nwin_under) or (roll_type == 'over' and rand_num >= nwin_over)
-            multiplier = 99.0 / chance
-            win_amount = 0
-            if is_win:
-                win_amount = math.floor(bet * multiplier)
-                user.balance += win_amount
+            rand_num, is_win, win_amount = roll_dice(bet, chance, roll_type)
+            user.balance += win_amount - bet
 
             session.add(DiceGame(user_id=user.id, bet=bet, chance=chance, roll_type=roll_type, roll_result=rand_num, win_amount=win_amount))
             await session.commit()
             return web.json_response({'success': True, 'result': rand_num, 'is_win': is_win, 'win_amount': win_amount, 'balance': user.balance})
 
 
+async def dice_auto(request):
+    """
+    Автоставка: до rolls бросков за один запрос и одну транзакцию.
+    stop_profit / stop_loss — остановка по чистому результату серии,
+    martingale — множитель ставки после проигрыша (после выигрыша ставка возвращается к базовой).
+    """
+    user_id = get_verified_user_id(request)
+    if user_id is None: return auth_error()
+    if check_rate(user_id, 'bet'):
+        return web.json_response({'success': False, 'error': 'Слишком много запросов'}, status=429)
+
+    data = await request.json()
+    base_bet = safe_positive_int(data.get('bet', 0))
+    chance = int(data.get('chance', 80))
+    roll_type = data.get('type', 'under')
+    rolls = safe_positive_int(data.get('rolls', 10))
+    stop_profit = safe_positive_int(data.get('stop_profit', 0))
+    stop_loss = safe_positive_int(data.get('stop_loss', 0))
+    try:
+        martingale = float(data.get('martingale') or 1.0)
+    except (TypeError, ValueError):
+        return web.json_response({'success': False, 'error': 'Неверный множитель мартингейла'})
+
+    error = validate_dice_params(base_bet, chance, roll_type)
+    if error: return web.json_response({'success': False, 'error': error})
+    if rolls < 1 or rolls > DICE_AUTO_MAX_ROLLS:
+        return web.json_response({'success': False, 'error': f'Бросков от 1 до {DICE_AUTO_MAX_ROLLS}'})
+    if not 1.0 <= martingale <= 10.0:
+        return web.json_response({'success': False, 'error': 'Множитель мартингейла от 1 до 10'})
+
+    async with get_user_lock(user_id):
+        async with async_session() as session:
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
+            if not user or user.balance < base_bet:
+                return web.json_response({'success': False, 'error': 'Недостаточно звезд'})
+
+            balance, net, bet = user.balance, 0, base_bet
+            results, rows = [], []
+            stopped = 'rolls'
+            for _ in range(rolls):
+                if bet > balance:
+                    stopped = 'balance'; break
+                if stop_loss and bet - net > stop_loss:  # следующий проигрыш превысил бы лимит убытка
+                    stopped = 'loss'; break
+                rand_num, is_win, win_amount = roll_dice(bet, chance, roll_type)
+                balance += win_amount - bet
+                net += win_amount - bet
+                results.append([rand_num, bet, win_amount])
+                rows.append({'user_id': user.id, 'bet': bet, 'chance': chance, 'roll_type': roll_type,
+                             'roll_result': rand_num, 'win_amount': win_amount})
+                bet = base_bet if is_win else math.ceil(bet * martingale)
+                if stop_profit and net >= stop_profit:
+                    stopped = 'profit'; break
+                if stop_loss and -net >= stop_loss:
+                    stopped = 'loss'; break
+
+            # Одна многострочная вставка и одно атомарное изменение баланса на всю серию: зачисления
+            # из других процессов (платеж в боте, реферальный бонус) за время серии не затираются
+            if rows:
+                await session.execute(insert(DiceGame), rows)
+                balance = (await session.execute(
+                    update(User).where(User.id == user.id, User.balance + net >= 0)
+                    .values(balance=User.balance + net).returning(User.balance)
+                    .execution_options(synchronize_session=False)
+                )).scalar_one_or_none()
+                if balance is None:
+                    await session.rollback()
+                    return web.json_response({'success': False, 'error': 'Баланс изменился, попробуйте еще раз'})
+                await session.commit()
+            return web.json_response({'success': True, 'results': results, 'rolls': len(results), 'net': net,
+                                      'stopped': stopped, 'balance': balance})
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # MINES
 # ═══════════════════════════════════════════════════════════════════════════════
 
+# Активные игры держим в памяти процесса (ключ — telegram_id): клик — это расчет на масках
+# и один UPDATE. UPDATE проверяет step и is_active (оптимистичная блокировка): если игру
+# изменил другой воркер, запись из кэша выбрасывается и игра перечитывается из БД.
+
+@dataclass
+class MinesState:
+    game_id: int
+    user_db_id: int
+    bet: int
+    bombs: int
+    step: int
+    mines_mask: int
+    clicked_mask: int
+    win_amount: int
+
+_mines_cache: dict[int, MinesState] = {}
+
+
+def cells_to_mask(cells) -> int:
+    mask = 0
+    for c in cells: mask |= 1 << c
+    return mask
+
+
+def mask_to_cells(mask: int) -> list[int]:
+    return [i for i in range(25) if mask >> i & 1]
+
+
+async def load_mines_state(session, telegram_id: int) -> MinesState | None:
+    """Активная игра из кэша или из БД (старые игры без масок читаются из JSON)."""
+    state = _mines_cache.get(telegram_id)
+    if state: return state
+    row = (await session.execute(queries.active_mines_game(telegram_id))).scalar_one_or_none()
+    if not row: return None
+    mines_mask = row.mines_mask if row.mines_mask is not None else cells_to_mask(json.loads(row.mines_positions or '[]'))
+    clicked_mask = row.clicked_mask if row.clicked_mask is not None else cells_to_mask(json.loads(row.clicked_positions or '[]'))
+    state = MinesState(row.id, row.user_id, row.bet, row.bombs, row.step or 0, mines_mask, clicked_mask, row.win_amount or 0)
+    _mines_cache[telegram_id] = state
+    return state
+
+
+# Брошенные игры (нет ходов дольше MINES_GAME_TTL): без открытых ячеек ставка сгорает как при
+# проигрыше (outcome='forfeit', 90% ставки — в банк), с открытыми — выигрыш забирается автоматически
+MINES_GAME_TTL = timedelta(hours=1)
+MINES_SWEEP_INTERVAL = 60   # секунд
+MINES_SWEEP_BATCH = 500
+
+
+async def forfeit_mines_games(session, *criteria) -> int:
+    """Закрывает активные игры по условию одним UPDATE ... RETURNING; возвращает сумму в банк."""
+    closed = (await session.execute(
+        queries.close_mines_games('forfeit', *criteria).returning(MinesGame.id, MinesGame.bet)
+    )).all()
+    if not closed: return 0
+    closed_ids = {row.id for row in closed}
+    for tg_id in [k for k, st in _mines_cache.items() if st.game_id in closed_ids]:
+        _mines_cache.pop(tg_id, None)
+    bank_delta = sum(int(row.bet * 0.9) for row in closed)
+    await adjust_bank(session, 'mines', bank_delta)
+    return bank_delta
+
+
+async def auto_collect_mines_games(session, *criteria) -> int:
+    """Закрывает активные игры с открытыми ячейками как выигрыш и зачисляет win_amount; возвращает сдвиг банка."""
+    closed = (await session.execute(
+        queries.close_mines_games('win', MinesGame.step > 0, *criteria)
+        .returning(MinesGame.id, MinesGame.user_id, MinesGame.bet, MinesGame.win_amount)
+    )).all()
+    if not closed: return 0
+    closed_ids = {row.id for row in closed}
+    for tg_id in [k for k, st in _mines_cache.items() if st.game_id in closed_ids]:
+        _mines_cache.pop(tg_id, None)
+    credits: dict[int, int] = {}
+    for row in closed:
+        credits[row.user_id] = credits.get(row.user_id, 0) + (row.win_amount or 0)
+    for user_db_id, amount in credits.items():
+        await session.execute(
+            update(User).where(User.id == user_db_id).values(balance=User.balance + amount)
+            .execution_options(synchronize_session=False)
+        )
+    bank_delta = -sum((row.win_amount or 0) - row.bet for row in closed)
+    await adjust_bank(session, 'mines', bank_delta)
+    return bank_delta
+
+
+async def settle_mines_games(session, *criteria) -> int:
+    """Закрытие незавершенных игр — общее правило для mines_start и чистильщика; возвращает сдвиг банка."""
+    bank_delta = await auto_collect_mines_games(session, *criteria)
+    return bank_delta + await forfeit_mines_games(session, *criteria)
+
+
+async def sweep_abandoned_mines() -> int:
+    """Закрывает игры без ходов дольше MINES_GAME_TTL пачками; возвращает число закрытых игр."""
+    total = 0
+    while True:
+        deadline = datetime.utcnow() - MINES_GAME_TTL
+        async with async_session() as session:
+            rows = (await session.execute(queries.idle_mines_games(deadline, MINES_SWEEP_BATCH))).all()
+        if not rows: return total
+        games_by_user: dict[int, list[int]] = {}
+        for game_id, tg_id in rows:
+            games_by_user.setdefault(tg_id, []).append(game_id)
+        for tg_id, ids in games_by_user.items():
+            # Под lock игрока: его обработчики пишут баланс целиком и иначе затерли бы зачисление
+            async with get_user_lock(tg_id):
+                async with async_session() as session:
+                    # Повторная проверка updated_at в самих UPDATE: ход, сделанный после выборки, игру спасает
+                    bank_delta = await settle_mines_games(session, MinesGame.id.in_(ids), MinesGame.updated_at < deadline)
+                    await session.commit()
+            apply_bank_delta('mines', bank_delta)
+        total += len(rows)
+        if len(rows) < MINES_SWEEP_BATCH: return total
+
+
+async def mines_sweeper_loop():
+    while True:
+        try:
+            closed = await sweep_abandoned_mines()
+            if closed: print(f'[MINES] Закрыто брошенных игр: {closed}')
+        except Exception as e:
+            print(f'[MINES] Ошибка чистильщика: {e}')
+        await asyncio.sleep(MINES_SWEEP_INTERVAL)
+
+
 async def mines_start(request):
     user_id = get_verified_user_id(request)
     if user_id is None: return auth_error()
@@ -953,26 +1381,31 @@ async def mines_start(request):
 
     async with get_user_lock(user_id):
         async with async_session() as session:
-            user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
-            if not user or user.balance < bet:
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
+            if not user: return web.json_response({'success': False, 'error': 'Недостаточно звезд'})
+
+            # Незавершенная игра закрывается как у чистильщика: с открытыми ячейками выигрыш
+            # зачисляется (UPDATE в SQL — перечитываем баланс), без них ставка сгорает
+            bank_delta = await settle_mines_games(session, MinesGame.user_id == user.id)
+            await session.refresh(user, ['balance'])
+            if user.balance < bet:
+                await session.rollback()
                 return web.json_response({'success': False, 'error': 'Недостаточно звезд'})
 
-            old_games = (await session.execute(select(MinesGame).where(MinesGame.user_id == user.id, MinesGame.is_active == True))).scalars().all()
-            for og in old_games: og.is_active = False
-
             user.balance -= bet
-            mines_pos = random.sample(list(range(25)), bombs)
+            mines_mask = cells_to_mask(random.sample(range(25), bombs))
             new_game = MinesGame(
                 user_id=user.id, bet=bet, bombs=bombs,
-                mines_positions=json.dumps(mines_pos), clicked_positions='[]', win_amount=bet
+                mines_mask=mines_mask, clicked_mask=0, win_amount=bet
             )
             session.add(new_game)
             await session.commit()
+            apply_bank_delta('mines', bank_delta)
+            _mines_cache[user_id] = MinesState(new_game.id, user.id, bet, bombs, 0, mines_mask, 0, bet)
             return web.json_response({'success': True, 'game_id': new_game.id, 'balance': user.balance})
 
 
 async def mines_click(request):
-    global MINES_BANK
     user_id = get_verified_user_id(request)
     if user_id is None: return auth_error()
     if check_rate(user_id, 'click'):
@@ -985,95 +1418,113 @@ async def mines_click(request):
         return web.json_response({'success': False, 'error': 'Неверная ячейка'})
     if cell < 0 or cell > 24:
         return web.json_response({'success': False, 'error': 'Ячейка вне диапазона'})
+    cell_bit = 1 << cell
 
     async with get_user_lock(user_id):
         async with async_session() as session:
-            user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
-            if not user: return web.json_response({'success': False, 'error': 'User not found'})
-
-            game = (await session.execute(
-                select(MinesGame).where(MinesGame.user_id == user.id, MinesGame.is_active == True)
-            )).scalar_one_or_none()
-            if not game: return web.json_response({'success': False, 'error': 'Нет активной игры'})
+            for _ in range(2):  # вторая попытка — после сброса устаревшего кэша
+                game = await load_mines_state(session, user_id)
+                if not game: return web.json_response({'success': False, 'error': 'Нет активной игры'})
 
-            mines_pos = json.loads(game.mines_positions)
-            clicked = json.loads(game.clicked_positions)
+                if game.clicked_mask & cell_bit:
+                    return web.json_response({'success': False, 'error': 'Ячейка уже открыта'})
 
-            if cell in clicked:
-                return web.json_response({'success': False, 'error': 'Ячейка уже открыта'})
+                # Максимум открытых ячеек = 25 - количество мин
+                max_safe = 25 - game.bombs
+                if game.clicked_mask.bit_count() >= max_safe:
+                    return web.json_response({'success': False, 'error': 'Все безопасные ячейки открыты'})
 
-            # Максимум открытых ячеек = 25 - количество мин
-            max_safe = 25 - game.bombs
-            if len(clicked) >= max_safe:
-                return web.json_response({'success': False, 'error': 'Все безопасные ячейки открыты'})
-
-            BASE_SCAM_CHANCE = 0.03
-            STEP_SCAM_CHANCE = 0.01
-
-            if cell not in mines_pos:
+                mines_mask = game.mines_mask
                 coefs = MINES_COEFS.get(game.bombs, [])
-                safe_step = min(game.step, len(coefs) - 1)
-                next_win = int(game.bet * coefs[safe_step])
-                force_lose = False
-                if (next_win - game.bet) > MINES_BANK:
-                    force_lose = True
-                elif random.random() < BASE_SCAM_CHANCE + (game.step * STEP_SCAM_CHANCE):
-                    force_lose = True
-                if force_lose and mines_pos:
-                    mine_to_remove = random.choice(mines_pos)
-                    mines_pos.remove(mine_to_remove)
-                    mines_pos.append(cell)
-                    game.mines_positions = json.dumps(mines_pos)
-
-            clicked.append(cell)
-            game.clicked_positions = json.dumps(clicked)
-
-            if cell in mines_pos:
-                game.is_active = False
-                MINES_BANK += int(game.bet * 0.9)
-                await session.commit()
-                return web.json_response({'success': True, 'status': 'lose', 'mines': mines_pos, 'clicked': clicked})
+                if not mines_mask & cell_bit:
+                    safe_step = min(game.step, len(coefs) - 1)
+                    next_win = int(game.bet * coefs[safe_step])
+                    force_lose = False
+                    if (next_win - game.bet) > bank_balance('mines'):
+                        force_lose = True
+                    elif random.random() < MINES_BASE_SCAM_CHANCE + (game.step * MINES_STEP_SCAM_CHANCE):
+                        force_lose = True
+                    if force_lose and mines_mask:
+                        mine_to_remove = random.choice(mask_to_cells(mines_mask))
+                        mines_mask = (mines_mask & ~(1 << mine_to_remove)) | cell_bit
+
+                clicked_mask = game.clicked_mask | cell_bit
+                lost = bool(mines_mask & cell_bit)
+                step = game.step if lost else game.step + 1
+                win_amount = game.win_amount if lost else int(game.bet * coefs[min(step - 1, len(coefs) - 1)])
+
+                result = await session.execute(queries.mines_move(
+                    game.game_id, game.step, mines_mask=mines_mask, clicked_mask=clicked_mask, step=step,
+                    win_amount=win_amount, is_active=not lost, outcome='lose' if lost else None
+                ))
+                if result.rowcount == 1: break
+                await session.rollback()
+                _mines_cache.pop(user_id, None)
             else:
-                game.step += 1
-                coefs = MINES_COEFS.get(game.bombs, [])
-                safe_step = min(game.step - 1, len(coefs) - 1)
-                game.win_amount = int(game.bet * coefs[safe_step])
-                await session.commit()
-                return web.json_response({'success': True, 'status': 'continue', 'win_amount': game.win_amount, 'step': game.step})
+                return web.json_response({'success': False, 'error': 'Игра изменилась, попробуйте еще раз'})
+
+            bank_delta = int(game.bet * 0.9) if lost else 0
+            await adjust_bank(session, 'mines', bank_delta)
+            await session.commit()
+            if lost:
+                _mines_cache.pop(user_id, None)
+                apply_bank_delta('mines', bank_delta)
+                return web.json_response({'success': True, 'status': 'lose', 'mines': mask_to_cells(mines_mask), 'clicked': mask_to_cells(clicked_mask)})
+            game.mines_mask, game.clicked_mask, game.step, game.win_amount = mines_mask, clicked_mask, step, win_amount
+            return web.json_response({'success': True, 'status': 'continue', 'win_amount': win_amount, 'step': step})
 
 
 async def mines_collect(request):
-    global MINES_BANK
     user_id = get_verified_user_id(request)
     if user_id is None: return auth_error()
 
     async with get_user_lock(user_id):
         async with async_session() as session:
-            user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
-            if not user: return web.json_response({'success': False, 'error': 'User not found'})
-
-            game = (await session.execute(
-                select(MinesGame).where(MinesGame.user_id == user.id, MinesGame.is_active == True)
-            )).scalar_one_or_none()
-            if not game or game.step == 0:
-                return web.json_response({'success': False, 'error': 'Нечего забирать'})
+            for _ in range(2):
+                game = await load_mines_state(session, user_id)
+                if not game or game.step == 0:
+                    return web.json_response({'success': False, 'error': 'Нечего забирать'})
+
+                # Закрываем СРАЗУ внутри lock условным UPDATE — защита от двойного collect
+                result = await session.execute(queries.mines_move(game.game_id, game.step, is_active=False, outcome='win'))
+                if result.rowcount == 1: break
+                await session.rollback()
+                _mines_cache.pop(user_id, None)
+            else:
+                return web.json_response({'success': False, 'error': 'Игра изменилась, попробуйте еще раз'})
 
-            # Закрываем СРАЗУ внутри lock — защита от двойного collect
-            game.is_active = False
+            user = await session.get(User, game.user_db_id)
             win_amount = game.win_amount
             user.balance += win_amount
-            MINES_BANK -= int(win_amount - game.bet)
-
-            mines_pos = json.loads(game.mines_positions)
-            clicked = json.loads(game.clicked_positions)
+            bank_delta = -int(win_amount - game.bet)
+            await adjust_bank(session, 'mines', bank_delta)
             await session.commit()
-            return web.json_response({'success': True, 'win_amount': win_amount, 'balance': user.balance, 'mines': mines_pos, 'clicked': clicked})
+            _mines_cache.pop(user_id, None)
+            apply_bank_delta('mines', bank_delta)
+            return web.json_response({'success': True, 'win_amount': win_amount, 'balance': user.balance,
+                                      'mines': mask_to_cells(game.mines_mask), 'clicked': mask_to_cells(game.clicked_mask)})
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # PLINKO
 # ═══════════════════════════════════════════════════════════════════════════════
 
+PLINKO_MAX_BALLS = 100
+
+
+def validate_plinko_params(bet, difficulty, pins):
+    if bet < 1: return 'Минимальная ставка 1 ⭐'
+    if difficulty not in ['low', 'medium', 'high']: return 'Неверная сложность'
+    if pins < 8 or pins > 16: return 'Пинов должно быть от 8 до 16'
+    return None
+
+
+def drop_plinko_ball(pins: int) -> tuple[int, int]:
+    """Путь шарика одним getrandbits: бит i = отскок вправо на ряду i, корзина = число единиц."""
+    path_bits = random.getrandbits(pins)
+    return path_bits, path_bits.bit_count()
+
+
 async def plinko_play(request):
     user_id = get_verified_user_id(request)
     if user_id is None: return auth_error()
@@ -1085,22 +1536,20 @@ async def plinko_play(request):
     difficulty = data.get('difficulty', 'low')
     pins = int(data.get('pins', 8))
 
-    if bet < 1: return web.json_response({'success': False, 'error': 'Минимальная ставка 1 ⭐'})
-    if difficulty not in ['low', 'medium', 'high']: return web.json_response({'success': False, 'error': 'Неверная сложность'})
-    if pins < 8 or pins > 16: return web.json_response({'success': False, 'error': 'Пинов должно быть от 8 до 16'})
+    error = validate_plinko_params(bet, difficulty, pins)
+    if error: return web.json_response({'success': False, 'error': error})
 
     async with get_user_lock(user_id):
         async with async_session() as session:
-            user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
             if not user or user.balance < bet:
                 return web.json_response({'success': False, 'error': 'Недостаточно звезд'})
-            user.balance -= bet
 
-            directions = [random.choice([0, 1]) for _ in range(pins)]
-            bucket = sum(directions)
+            path_bits, bucket = drop_plinko_ball(pins)
+            directions = [(path_bits >> i) & 1 for i in range(pins)]
             multiplier = PLINKO_MULTIPLIERS[difficulty][pins][bucket]
             win_amount = math.floor(bet * multiplier)
-            user.balance += win_amount
+            user.balance += win_amount - bet
 
             session.add(PlinkoGame(user_id=user.id, bet=bet, difficulty=difficulty,
                                    pins=pins, bucket=bucket, multiplier=multiplier, win_amount=win_amount))
@@ -1109,15 +1558,132 @@ async def plinko_play(request):
                                   'multiplier': multiplier, 'win_amount': win_amount, 'balance': user.balance})
 
 
+async def plinko_multi(request):
+    """Несколько шариков за запрос: одна проверка баланса, одна вставка, одно изменение баланса."""
+    user_id = get_verified_user_id(request)
+    if user_id is None: return auth_error()
+    if check_rate(user_id, 'bet'):
+        return web.json_response({'success': False, 'error': 'Слишком много запросов'}, status=429)
+
+    data = await request.json()
+    bet = safe_positive_int(data.get('bet', 0))
+    difficulty = data.get('difficulty', 'low')
+    pins = int(data.get('pins', 8))
+    balls = safe_positive_int(data.get('balls', 1))
+
+    error = validate_plinko_params(bet, difficulty, pins)
+    if error: return web.json_response({'success': False, 'error': error})
+    if balls < 1 or balls > PLINKO_MAX_BALLS:
+        return web.json_response({'success': False, 'error': f'Шариков от 1 до {PLINKO_MAX_BALLS}'})
+
+    multipliers = PLINKO_MULTIPLIERS[difficulty][pins]
+    async with get_user_lock(user_id):
+        async with async_session() as session:
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
+            if not user or user.balance < bet * balls:
+                return web.json_response({'success': False, 'error': 'Недостаточно звезд'})
+
+            results, rows, total_win = [], [], 0
+            for _ in range(balls):
+                path_bits, bucket = drop_plinko_ball(pins)
+                win_amount = math.floor(bet * multipliers[bucket])
+                total_win += win_amount
+                results.append([path_bits, bucket, win_amount])
+                rows.append({'user_id': user.id, 'bet': bet, 'difficulty': difficulty, 'pins': pins,
+                             'bucket': bucket, 'multiplier': multipliers[bucket], 'win_amount': win_amount})
+
+            await session.execute(insert(PlinkoGame), rows)
+            user.balance += total_win - bet * balls
+            await session.commit()
+        # path_bits: бит i (младший — первый ряд) = 1, если шарик отскочил вправо
+        return web.json_response({'success': True, 'balls': results, 'total_win': total_win, 'balance': user.balance})
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # UPGRADE
 # ═══════════════════════════════════════════════════════════════════════════════
 
+# Шанс апгрейда: вложено / цена цели * 100 * UPGRADE_MARGIN, но не выше UPGRADE_MAX_CHANCE
+UPGRADE_MAX_CHANCE = 85.0
+UPGRADE_MARGIN = 0.95
+UPGRADE_MIN_TARGET_CHANCE = 0.01  # % — нижняя граница поиска целей по умолчанию
+
+
+def upgrade_chance(total_inject: int, target_value: int) -> float:
+    return min(UPGRADE_MAX_CHANCE, (total_inject / (target_value or 1) * 100) * UPGRADE_MARGIN)
+
+
+class GiftCatalog:
+    """
+    Каталог апгрейда в памяти: готовый JSON-ответ (bytes) с ETag и отсортированный массив цен
+    для поиска целей по диапазону шанса бинпоиском. Каталог меняет только скрипт наполнения
+    из другого процесса, поэтому достаточно перечитывать его раз в TTL секунд.
+    """
+    TTL = 300
+
+    def __init__(self):
+        self.gifts: list[dict] = []
+        self.values: list[int] = []
+        self.body = b''
+        self.etag = ''
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> 'GiftCatalog':
+        if time.monotonic() >= self._expires_at:
+            async with self._lock:
+                if time.monotonic() >= self._expires_at: await self.reload()
+        return self
+
+    async def reload(self):
+        async with async_session() as session:
+            rows = (await session.execute(queries.upgrade_catalog_gifts())).all()
+        self.gifts = [{'id': g.id, 'name': g.name, 'value': g.value, 'image_url': g.image_url, 'gift_number': g.gift_number,
+                       'is_stars': bool(g.gift_number and g.gift_number >= 200)} for g in rows]
+        self.values = [g['value'] for g in self.gifts]
+        self.body = json.dumps({'success': True, 'gifts': self.gifts}, ensure_ascii=False).encode()
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest() + '"'
+        self._expires_at = time.monotonic() + self.TTL
+
+    def invalidate(self):
+        self._expires_at = 0.0
+
+    def value_range(self, total_inject: int, min_chance: float, max_chance: float) -> tuple[int, int]:
+        """Срез self.gifts, где шанс апгрейда в [min_chance, max_chance] (шанс убывает с ценой)."""
+        if total_inject <= 0 or max_chance <= 0 or min_chance > UPGRADE_MAX_CHANCE or min_chance > max_chance: return 0, 0
+        k = total_inject * 100 * UPGRADE_MARGIN  # raw_chance = k / value
+        lo = 0 if max_chance >= UPGRADE_MAX_CHANCE else bisect.bisect_left(self.values, k / max_chance)
+        hi = len(self.values) if min_chance <= 0 else bisect.bisect_right(self.values, k / min_chance)
+        return lo, max(lo, hi)
+
+
+gift_catalog = GiftCatalog()
+
+
 async def get_all_gifts(request):
-    async with async_session() as session:
-        gifts = (await session.execute(select(Gift).where(Gift.value > 0).order_by(Gift.value))).scalars().all()
-        data = [{'id': g.id, 'name': g.name, 'value': g.value, 'image_url': g.image_url, 'gift_number': g.gift_number, 'is_stars': bool(g.gift_number and g.gift_number >= 200)} for g in gifts]
-        return web.json_response({'success': True, 'gifts': data})
+    catalog = await gift_catalog.get()
+    headers = {'ETag': catalog.etag, 'Cache-Control': 'no-cache'}
+    if catalog.etag in request.headers.get('If-None-Match', ''):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=catalog.body, content_type='application/json', headers=headers)
+
+
+async def get_upgrade_targets(request):
+    """Цели апгрейда, у которых шанс при вложении inject попадает в [min_chance, max_chance] %."""
+    try:
+        total_inject = int(request.query.get('inject', 0))
+        min_chance = float(request.query.get('min_chance', UPGRADE_MIN_TARGET_CHANCE))
+        max_chance = float(request.query.get('max_chance', UPGRADE_MAX_CHANCE))
+    except ValueError:
+        return web.json_response({'success': False, 'error': 'Неверные параметры'}, status=400)
+    if not 0 < min_chance <= max_chance <= UPGRADE_MAX_CHANCE:
+        return web.json_response({'success': False, 'error': f'Шансы: 0 < min_chance ≤ max_chance ≤ {UPGRADE_MAX_CHANCE}'}, status=400)
+    limit = page_size(request)
+
+    catalog = await gift_catalog.get()
+    lo, hi = catalog.value_range(total_inject, min_chance, max_chance)
+    targets = [dict(g, chance=round(upgrade_chance(total_inject, g['value']), 2)) for g in catalog.gifts[lo:min(hi, lo + limit)]]
+    return web.json_response({'success': True, 'targets': targets, 'total': hi - lo})
 
 async def upgrade_bet(request):
     user_id = get_verified_user_id(request)
@@ -1135,7 +1701,7 @@ async def upgrade_bet(request):
 
     async with get_user_lock(user_id):
         async with async_session() as session:
-            user = (await session.execute(select(User).where(User.telegram_id == user_id))).scalar_one_or_none()
+            user = (await session.execute(queries.user_by_telegram_id(user_id))).scalar_one_or_none()
             if not user or user.balance < added_balance:
                 return web.json_response({'success': False, 'error': 'Недостаточно звезд на балансе'})
 
@@ -1143,9 +1709,7 @@ async def upgrade_bet(request):
             if not target_gift:
                 return web.json_response({'success': False, 'error': 'Целевой предмет не найден'})
 
-            openings = (await session.execute(
-                select(CaseOpening).where(CaseOpening.id.in_(inventory_item_ids)).options(joinedload(CaseOpening.gift))
-            )).scalars().unique().all()
+            openings = (await session.execute(queries.openings_by_ids(inventory_item_ids))).scalars().unique().all()
             
             if len(openings) != len(inventory_item_ids):
                 return web.json_response({'success': False, 'error': 'Один или несколько предметов из инвентаря не найдены'})
@@ -1160,10 +1724,7 @@ async def upgrade_bet(request):
             target_value = target_gift.value or 1
             
             # Chance with 5% margin, capped at 85%
-            max_chance = 85.0
-            margin = 0.95
-            raw_chance = (total_inject / target_value * 100) * margin
-            chance = min(max_chance, raw_chance)
+            chance = upgrade_chance(total_inject, target_value)
 
             # Roll is 0 to 100
             roll = random.uniform(0, 100)
@@ -1175,14 +1736,21 @@ async def upgrade_bet(request):
                 opening.is_sold = True 
 
             new_opening = None
+            inventory_count_delta, inventory_value_delta, openings_delta = -len(openings), -inventory_value, 0
             if is_successful:
+                openings_delta = 1
                 # Give target gift
                 new_opening = CaseOpening(user_id=user.id, case_id=None, gift_id=target_gift.id)
                 is_stars = bool(target_gift.gift_number and target_gift.gift_number >= 200)
                 if is_stars:
                     user.balance += target_gift.value
                     new_opening.is_sold = True
+                else:
+                    inventory_count_delta += 1
+                    inventory_value_delta += target_gift.value or 0
                 session.add(new_opening)
+            await bump_user_stats(session, user.id, total_openings=openings_delta,
+                                  inventory_count=inventory_count_delta, inventory_value=inventory_value_delta)
 
             upgrade = UpgradeGame(
                 user_id=user.id,
@@ -1198,6 +1766,7 @@ async def upgrade_bet(request):
             result_gift_data = None
             if is_successful:
                 await session.refresh(new_opening)
+                live_feed.push(new_opening, user, target_gift)
                 result_gift_data = {
                     'opening_id': new_opening.id,
                     'is_stars': bool(target_gift.gift_number and target_gift.gift_number >= 200),
@@ -1232,8 +1801,38 @@ async def favicon(request):
 # APP
 # ═══════════════════════════════════════════════════════════════════════════════
 
+async def background_tasks_ctx(app):
+    """Сверка кэша банка с БД (изменения других воркеров), чистильщик брошенных игр в мины,
+    обслуживание SQLite и опрос ленты дропов (дропы из бота)."""
+    tasks = [
+        asyncio.create_task(reconcile_banks_loop()),
+        asyncio.create_task(mines_sweeper_loop()),
+        asyncio.create_task(sqlite_maintenance_loop(engine)),
+        asyncio.create_task(live_feed.poll_loop()),
+    ]
+    yield
+    for task in tasks: task.cancel()
+
+TG_API = web.AppKey('tg_api', TelegramAPI)
+OUTBOUND = web.AppKey('outbound', OutboundDispatcher)
+
+# Лимит Telegram общий на токен: основную долю забирает бот (рассылки), серверу хватает малой
+SERVER_SEND_RATE = float(os.getenv('SERVER_SEND_RATE', '5'))
+
+async def telegram_api_ctx(app):
+    """Один HTTP-клиент к Bot API и очередь отправки на все приложение; закрываются в runner.cleanup()."""
+    app[TG_API] = TelegramAPI(os.getenv('BOT_TOKEN', ''))
+    await app[TG_API].start()
+    app[OUTBOUND] = OutboundDispatcher(rate=SERVER_SEND_RATE, workers=2, name='server-tg')
+    await app[OUTBOUND].start()
+    yield
+    await app[OUTBOUND].stop()
+    await app[TG_API].close()
+
 async def create_app():
     app = web.Application(middlewares=[log_middleware, error_middleware])
+    app.cleanup_ctx.append(telegram_api_ctx)
+    app.cleanup_ctx.append(background_tasks_ctx)
     cors = aiohttp_cors.setup(app, defaults={'*': aiohttp_cors.ResourceOptions(
         allow_credentials=True, expose_headers='*', allow_headers='*'
     )})
@@ -1249,7 +1848,9 @@ async def create_app():
         web.get('/api/inventory/{telegram_id}',           get_inventory),
         web.post('/api/withdraw',                         withdraw_item),
         web.post('/api/sell',                             sell_item),
+        web.post('/api/sell/bulk',                        sell_bulk),
         web.get('/api/history/recent',                    get_history),
+        web.get('/api/history/ws',                        history_ws),
         web.post('/api/payment/create-invoice',           create_invoice),
         web.post('/api/mines/start',                      mines_start),
         web.post('/api/mines/click',                      mines_click),
@@ -1258,9 +1859,12 @@ async def create_app():
         web.post('/api/crash/bet',                        crash_bet),
         web.post('/api/crash/cashout',                    crash_cashout),
         web.post('/api/dice/play',                        dice_play),
+        web.post('/api/dice/auto',                        dice_auto),
         web.post('/api/promo/activate',                   activate_promo),
         web.post('/api/plinko/play',                      plinko_play),
+        web.post('/api/plinko/multi',                     plinko_multi),
         web.get('/api/upgrade/gifts',                     get_all_gifts),
+        web.get('/api/upgrade/targets',                   get_upgrade_targets),
         web.post('/api/upgrade/bet',                      upgrade_bet),
     ]
     for route in api_routes:
@@ -1270,6 +1874,8 @@ async def create_app():
     os.makedirs('dist/assets', exist_ok=True)
     app.router.add_static('/assets', 'dist/assets', show_index=False)
     await init_db()
+    await init_banks()
+    await live_feed.warm()
     return app
 
 
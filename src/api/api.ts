@@ -133,6 +133,16 @@ export const playPlinkoApi = async (_userId: string | number, bet: number, diffi
     catch (e) { return e; }
 };
 
+// Несколько шариков за запрос; balls — [path_bits, bucket, win_amount] на каждый шарик
+export const playPlinkoMultiApi = async (bet: number, difficulty: string, pins: number, balls: number) => {
+    try { return await api.post('/plinko/multi', { bet, difficulty, pins, balls }) as any; }
+    catch (e) { return e; }
+};
+
+// Путь шарика из битовой маски: бит i = 1 — отскок вправо на ряду i
+export const plinkoPathFromBits = (pathBits: number, pins: number): number[] =>
+    Array.from({ length: pins }, (_, i) => (pathBits >> i) & 1);
+
 // ─────────────────────────────────────────────────────────────────────────────
 // Dice API
 // ─────────────────────────────────────────────────────────────────────────────
@@ -141,6 +151,19 @@ export const playDiceApi = async (_userId: string | number, bet: number, chance:
     catch (e) { return e; }
 };
 
+export interface DiceAutoOptions {
+    rolls: number;
+    stop_profit?: number;
+    stop_loss?: number;
+    martingale?: number;
+}
+
+// Серия бросков за один запрос; results — [число, ставка, выигрыш] на каждый бросок
+export const playDiceAutoApi = async (bet: number, chance: number, type: 'under' | 'over', options: DiceAutoOptions) => {
+    try { return await api.post('/dice/auto', { bet, chance, type, ...options }) as any; }
+    catch (e) { return e; }
+};
+
 // ─────────────────────────────────────────────────────────────────────────────
 // Crash API
 // ─────────────────────────────────────────────────────────────────────────────
@@ -157,8 +180,23 @@ export const crashCashoutApi = async (_userId?: string | number) => {
 // ─────────────────────────────────────────────────────────────────────────────
 // Inventory API
 // ─────────────────────────────────────────────────────────────────────────────
+// Сервер отдает инвентарь страницами (не больше 200 за запрос) — собираем весь, следуя next_cursor
+const INVENTORY_PAGE_MAX = 200;
+
 export const fetchInventoryApi = async (telegramId: string | number) => {
-    try { return await api.get(`/inventory/${telegramId}`) as any; }
+    try {
+        const inventory: any[] = [];
+        let cursor: string | null = null;
+        do {
+            const params: Record<string, any> = { limit: INVENTORY_PAGE_MAX };
+            if (cursor) params.cursor = cursor;
+            const res = await api.get(`/inventory/${telegramId}`, { params }) as any;
+            if (!res.success) return res;
+            inventory.push(...(res.inventory || []));
+            cursor = res.next_cursor || null;
+        } while (cursor);
+        return { success: true, inventory };
+    }
     catch (e) { return e; }
 };
 
@@ -172,6 +210,13 @@ export const sellItemApi = async (openingId: number, _userId?: string | number)
     catch (e) { return e; }
 };
 
+// Продажа пачкой: список opening_id или весь инвентарь (all = true)
+export const sellBulkApi = async (openingIds: number[] | 'all') => {
+    const payload = openingIds === 'all' ? { all: true } : { opening_ids: openingIds };
+    try { return await api.post('/sell/bulk', payload) as any; }
+    catch (e) { return e; }
+};
+
 // ─────────────────────────────────────────────────────────────────────────────
 // Referrals API
 // ─────────────────────────────────────────────────────────────────────────────
@@ -217,6 +262,12 @@ export const fetchUpgradeGiftsApi = async () => {
     catch (e) { return e; }
 };
 
+// Цели апгрейда, где шанс при вложении inject ⭐ лежит в [minChance, maxChance] %
+export const fetchUpgradeTargetsApi = async (inject: number, minChance: number, maxChance: number, limit = 50) => {
+    try { return await api.get('/upgrade/targets', { params: { inject, min_chance: minChance, max_chance: maxChance, limit } }) as any; }
+    catch (e) { return e; }
+};
+
 export const upgradeBetApi = async (inventory_item_ids: number[], target_gift_id: number, added_balance: number) => {
     try { return await api.post('/upgrade/bet', { inventory_item_ids, target_gift_id, added_balance }) as any; }
     catch (e) { return e; }
@@ -98,6 +98,40 @@ export default function CasesPage() {
         loadHistory();
     }, []);
 
+    // Live-лента: сервер присылает снимок при подключении и дальше только новые дропы
+    useEffect(() => {
+        let ws: WebSocket | null = null;
+        let reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+        let closed = false;
+
+        const connect = () => {
+            const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+            ws = new WebSocket(`${protocol}//${window.location.host}/api/history/ws`);
+            ws.onmessage = (event) => {
+                const data = JSON.parse(event.data);
+                if (data.type === 'snapshot') {
+                    _cachedHistory = data.drops || [];
+                } else if (data.type === 'drop') {
+                    _cachedHistory = [data.drop, ..._cachedHistory.filter(h => h.id !== data.drop.id)].slice(0, 50);
+                } else {
+                    return;
+                }
+                setHistory(_cachedHistory);
+            };
+            ws.onclose = () => {
+                ws = null;
+                if (!closed) reconnectTimer = setTimeout(connect, 2000);
+            };
+        };
+
+        connect();
+        return () => {
+            closed = true;
+            if (reconnectTimer) clearTimeout(reconnectTimer);
+            if (ws) ws.close();
+        };
+    }, []);
+
     const loadCases = async () => {
         if (_cachedCases.length === 0) setLoading(true);
         const res = await fetchCasesApi();
@@ -24,6 +24,9 @@ export default function InventoryPage() {
 
     const [inventory, setInventory] = useState<InventoryItem[]>([]);
     const [loading, setLoading] = useState(true);
+    // Курсор следующей страницы (сервер отдает инвентарь порциями)
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     const telegramId = (window as any).Telegram?.WebApp?.initDataUnsafe?.user?.id;
 
@@ -38,11 +41,25 @@ export default function InventoryPage() {
             const res = await api.get(`/inventory/${telegramId}`) as any;
             if (res.success) {
                 setInventory(res.inventory || []);
+                setNextCursor(res.next_cursor || null);
             }
         } catch (e) { }
         setLoading(false);
     };
 
+    const loadMore = async () => {
+        if (!telegramId || !nextCursor || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const res = await api.get(`/inventory/${telegramId}`, { params: { cursor: nextCursor } }) as any;
+            if (res.success) {
+                setInventory(prev => [...prev, ...(res.inventory || [])]);
+                setNextCursor(res.next_cursor || null);
+            }
+        } catch (e) { }
+        setLoadingMore(false);
+    };
+
     const withdrawItem = async (openingId: number) => {
         setLoaderVisible(true);
         try {
@@ -139,6 +156,12 @@ export default function InventoryPage() {
                         ))}
                     </div>
                 )}
+                {!loading && nextCursor && (
+                    <button className="btn-inv btn-inv-withdraw" style={{ width: '100%', marginTop: '12px' }}
+                        disabled={loadingMore} onClick={loadMore}>
+                        {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+                    </button>
+                )}
             </div>
         </div>
     );
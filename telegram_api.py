@@ -0,0 +1,74 @@
+"""
+Клиент Telegram Bot API для server.py.
+
+Одна aiohttp-сессия на все время жизни приложения: keep-alive пул соединений
+к api.telegram.org, общие таймауты и аккуратное закрытие при остановке.
+Адрес API берется из TELEGRAM_API_URL — в тестах его можно подменить локальной заглушкой.
+"""
+import os
+from typing import Any
+
+import aiohttp
+
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+
+
+class TelegramAPIError(Exception):
+    """Ответ Bot API с ok=false (или не-JSON ответ)."""
+
+    def __init__(self, method: str, error_code: int, description: str, retry_after: int | None = None):
+        super().__init__(f'{method}: [{error_code}] {description}')
+        self.method = method
+        self.error_code = error_code
+        self.description = description
+        self.retry_after = retry_after  # секунды ожидания при 429 Too Many Requests
+
+
+class TelegramAPI:
+    def __init__(self, token: str, base_url: str | None = None,
+                 timeout: float = 10.0, pool_size: int = 20):
+        self.token = token
+        self.base_url = (base_url or TELEGRAM_API_URL).rstrip('/')
+        self._timeout = aiohttp.ClientTimeout(total=timeout, connect=5)
+        self._pool_size = pool_size
+        self._session: aiohttp.ClientSession | None = None
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._pool_size, keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def call(self, method: str, payload: dict) -> Any:
+        """Вызов метода Bot API. Возвращает поле result, при ok=false бросает TelegramAPIError."""
+        if self._session is None:
+            await self.start()
+        url = f'{self.base_url}/bot{self.token}/{method}'
+        async with self._session.post(url, json=payload) as resp:
+            try:
+                data = await resp.json(content_type=None)
+            except ValueError:
+                raise TelegramAPIError(method, resp.status, 'Invalid JSON response')
+        if not data.get('ok'):
+            parameters = data.get('parameters') or {}
+            raise TelegramAPIError(method, data.get('error_code', resp.status),
+                                   data.get('description', 'Ошибка API'), parameters.get('retry_after'))
+        return data['result']
+
+    async def create_invoice_link(self, title: str, description: str, payload: str,
+                                  currency: str, prices: list[dict], provider_token: str = '') -> str:
+        return await self.call('createInvoiceLink', {
+            'title': title, 'description': description, 'payload': payload,
+            'provider_token': provider_token, 'currency': currency, 'prices': prices
+        })
+
+    async def send_message(self, chat_id: int, text: str, parse_mode: str | None = None,
+                           reply_markup: dict | None = None) -> dict:
+        payload = {'chat_id': chat_id, 'text': text}
+        if parse_mode: payload['parse_mode'] = parse_mode
+        if reply_markup: payload['reply_markup'] = reply_markup
+        return await self.call('sendMessage', payload)
@@ -0,0 +1,219 @@
+"""
+Очередь исходящих сообщений в Telegram.
+
+Все отправки (уведомления админам, реферальные уведомления, рассылки) идут через
+OutboundDispatcher, а не напрямую:
+  • приоритетная очередь — транзакционные сообщения обгоняют рассылку;
+  • глобальный token bucket (~30 сообщений/с на токен бота);
+  • пауза между сообщениями в один чат (Telegram режет >1 msg/s в чат);
+  • 429 retry_after ставит на паузу весь диспетчер, сетевые/5xx ошибки — повтор с backoff;
+  • постоянные ошибки (403 бот заблокирован, 400) и исчерпанные повторы уходят в dead-letter.
+
+Диспетчер не привязан к конкретному клиенту: submit() принимает фабрику корутины, поэтому
+одинаково работает с aiogram (bot.send_message, message.copy_to) и с telegram_api.TelegramAPI.
+Лимит Telegram общий на токен, а бот и сервер — разные процессы, поэтому каждый получает
+свою долю rate.
+"""
+import asyncio
+import itertools
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+try:
+    from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNotFound
+    _AIOGRAM_PERMANENT: tuple = (TelegramForbiddenError, TelegramBadRequest, TelegramNotFound)
+except ImportError:  # сервер может работать без aiogram
+    _AIOGRAM_PERMANENT = ()
+
+GLOBAL_RATE = 30          # сообщений в секунду на токен бота
+PER_CHAT_INTERVAL = 1.0   # секунд между сообщениями в один чат
+
+PRIORITY_HIGH = 0         # уведомления админам, ответы на действия пользователя
+PRIORITY_NORMAL = 5       # уведомления (реферальные награды и т.п.)
+PRIORITY_BULK = 10        # рассылки
+
+PERMANENT_ERROR_CODES = (400, 403, 404)
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity в запасе."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class DeadLetter:
+    chat_id: int
+    error: str
+    attempts: int
+    failed_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class _Job:
+    send: Callable[[], Awaitable[Any]]
+    chat_id: int
+    priority: int
+    future: asyncio.Future
+    attempts: int = 0
+
+
+def retry_after_of(exc: BaseException) -> float | None:
+    """retry_after из ошибки 429: aiogram TelegramRetryAfter, TelegramAPIError или сырой parameters."""
+    value = getattr(exc, 'retry_after', None)
+    if value is None:
+        params = getattr(exc, 'parameters', None)
+        value = params.get('retry_after') if isinstance(params, dict) else getattr(params, 'retry_after', None)
+    return float(value) if value else None
+
+
+def is_permanent(exc: BaseException) -> bool:
+    """Ошибки, которые повтор не исправит: бот заблокирован, чат не найден, кривой запрос."""
+    if _AIOGRAM_PERMANENT and isinstance(exc, _AIOGRAM_PERMANENT): return True
+    return getattr(exc, 'error_code', None) in PERMANENT_ERROR_CODES
+
+
+class OutboundDispatcher:
+    def __init__(self, rate: float = GLOBAL_RATE, per_chat_interval: float = PER_CHAT_INTERVAL,
+                 workers: int = 8, max_retries: int = 5, base_backoff: float = 1.0,
+                 on_dead_letter: Callable[[DeadLetter], Any] | None = None, name: str = 'tg'):
+        self.name = name
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.on_dead_letter = on_dead_letter
+        self.dead_letters: deque[DeadLetter] = deque(maxlen=1000)
+        self._bucket = TokenBucket(rate)
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._chat_next: dict[int, float] = {}   # chat_id → monotonic время, раньше которого не слать
+        self._paused_until = 0.0                 # глобальная пауза после 429
+        self._workers_count = workers
+        self._workers: list[asyncio.Task] = []
+        self._delayed: set[asyncio.TimerHandle] = set()
+        self.sent = 0
+        self.failed = 0
+
+    # ─── жизненный цикл ───────────────────────────────────────────────────────
+
+    async def start(self):
+        if self._workers: return
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._workers_count)]
+
+    async def stop(self):
+        """Останавливает воркеров; неотправленные сообщения отменяются."""
+        for handle in self._delayed: handle.cancel()
+        self._delayed.clear()
+        for task in self._workers: task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        while not self._queue.empty():
+            _, _, job = self._queue.get_nowait()
+            if not job.future.done(): job.future.cancel()
+
+    # ─── API ──────────────────────────────────────────────────────────────────
+
+    def submit(self, send: Callable[[], Awaitable[Any]], chat_id: int,
+               priority: int = PRIORITY_NORMAL) -> asyncio.Future:
+        """
+        Ставит отправку в очередь. send — фабрика корутины (вызывается на каждую попытку),
+        например lambda: bot.send_message(chat_id, text). Возвращает future с результатом
+        отправки или последней ошибкой; ждать его не обязательно.
+        """
+        future = asyncio.get_running_loop().create_future()
+        # fire-and-forget вызовы не должны сыпать "exception was never retrieved"
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._put(_Job(send, chat_id, priority, future))
+        return future
+
+    def pending(self) -> int:
+        return self._queue.qsize() + len(self._delayed)
+
+    # ─── внутреннее ───────────────────────────────────────────────────────────
+
+    def _put(self, job: _Job, delay: float = 0.0):
+        if delay <= 0:
+            self._queue.put_nowait((job.priority, next(self._seq), job))
+            return
+        handle = None
+        def requeue():
+            self._delayed.discard(handle)
+            self._queue.put_nowait((job.priority, next(self._seq), job))
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._delayed.add(handle)
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                if job.future.cancelled(): continue
+                now = time.monotonic()
+                if self._paused_until > now:
+                    await asyncio.sleep(self._paused_until - now)
+                    now = time.monotonic()
+                ready_at = self._chat_next.get(job.chat_id, 0.0)
+                if ready_at > now:
+                    # чат еще «остывает» — возвращаем в очередь, воркер не простаивает
+                    self._put(job, ready_at - now)
+                    continue
+                self._chat_next[job.chat_id] = now + self.per_chat_interval
+                await self._bucket.acquire()
+                await self._attempt(job)
+            finally:
+                self._queue.task_done()
+                if len(self._chat_next) > 10000: self._gc_chats()
+
+    async def _attempt(self, job: _Job):
+        job.attempts += 1
+        try:
+            result = await job.send()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            retry_after = retry_after_of(e)
+            if retry_after is not None and job.attempts <= self.max_retries:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                print(f'[{self.name}] 429, пауза {retry_after}s')
+                self._put(job, retry_after)
+            elif not is_permanent(e) and job.attempts <= self.max_retries:
+                backoff = self.base_backoff * 2 ** (job.attempts - 1)
+                self._put(job, backoff + random.uniform(0, backoff / 2))
+            else:
+                self._dead_letter(job, e)
+            return
+        self.sent += 1
+        if not job.future.done(): job.future.set_result(result)
+
+    def _dead_letter(self, job: _Job, exc: Exception):
+        self.failed += 1
+        letter = DeadLetter(job.chat_id, f'{type(exc).__name__}: {exc}', job.attempts)
+        self.dead_letters.append(letter)
+        if not is_permanent(exc):  # 403/400 — штатная ситуация для рассылок, в лог не шумим
+            print(f'[{self.name}] dead-letter chat={job.chat_id} attempts={job.attempts}: {letter.error}')
+        if self.on_dead_letter:
+            try: self.on_dead_letter(letter)
+            except Exception as cb_err: print(f'[{self.name}] on_dead_letter error: {cb_err}')
+        if not job.future.done(): job.future.set_exception(exc)
+
+    def _gc_chats(self):
+        now = time.monotonic()
+        self._chat_next = {cid: t for cid, t in self._chat_next.items() if t > now}